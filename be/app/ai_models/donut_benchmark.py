@@ -0,0 +1,90 @@
+# app/ai_models/donut_benchmark.py
+"""
+Compare Donut inference backends on a folder of sample receipts.
+
+Usage::
+
+    python -m app.ai_models.donut_benchmark path/to/receipts --backends none int8 onnx
+
+The first backend is the reference: for every other backend the script reports
+latency and how often its extracted fields match the reference output.
+"""
+import argparse
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from app.ai_models import donut_loader
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+COMPARED_FIELDS = ("total", "date", "category", "items", "raw_ocr")
+
+
+def _run_backend(name: str, image_paths: List[Path]):
+    donut_loader.load_model(name, reload=True)
+    if donut_loader.backend != name:
+        print(f"[{name}] not available (loaded '{donut_loader.backend}'), skipped")
+        return None, None
+
+    # Warm-up agar waktu load/compile pertama tidak ikut terukur
+    donut_loader.predict_from_image_path(str(image_paths[0]))
+
+    results = []
+    latencies = []
+    for path in image_paths:
+        start = time.perf_counter()
+        results.append(donut_loader.predict_from_image_path(str(path)))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+
+def _agreement(reference: List[Dict], candidate: List[Dict]) -> Dict[str, float]:
+    return {
+        field: 100.0
+        * sum(r.get(field) == c.get(field) for r, c in zip(reference, candidate))
+        / len(reference)
+        for field in COMPARED_FIELDS
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("folder", type=Path, help="Folder with receipt images")
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=list(donut_loader.DONUT_BACKENDS),
+        choices=donut_loader.DONUT_BACKENDS,
+    )
+    args = parser.parse_args()
+
+    image_paths = sorted(
+        p for p in args.folder.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES
+    )
+    if not image_paths:
+        raise SystemExit(f"No images found in {args.folder}")
+
+    reference = None
+    reference_mean = None
+    for name in args.backends:
+        results, latencies = _run_backend(name, image_paths)
+        if results is None:
+            continue
+
+        mean = statistics.mean(latencies)
+        p95 = sorted(latencies)[max(0, int(len(latencies) * 0.95) - 1)]
+        line = f"[{name}] mean {mean * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms"
+
+        if reference is None:
+            reference, reference_mean = results, mean
+        else:
+            match = _agreement(reference, results)
+            line += f", speedup {reference_mean / mean:.2f}x, match " + ", ".join(
+                f"{field} {pct:.0f}%" for field, pct in match.items()
+            )
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
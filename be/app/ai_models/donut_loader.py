@@ -1,388 +1,347 @@
 import argparse
 import json
 import logging
-import re
-from typing import Dict, List, Optional
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional, Tuple, Union
 
 import torch
+from app.ai_models.donut_parser import parse_donut_output
+from app.ai_models.image_preprocess import preprocess_receipt
+from app.config import DONUT_MAX_NEW_TOKENS, DONUT_ONNX_DIR, DONUT_OPTIMIZATION
+from app.utils.category_classifier import get_classifier
+from app.utils.log import log_payload
+from app.utils.money import parse_amount
 from PIL import Image
-from transformers import DonutProcessor, VisionEncoderDecoderModel
 
 # Setup logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load Vision Encoder-Decoder Model with Donut Processor
 MODEL_NAME = "naver-clova-ix/donut-base-finetuned-cord-v2"
 task_name = "cord-v2"
 task_prompt = f"<s_{task_name}>"
+TOTAL_CLOSE_TAG = "</s_total>"
 
-try:
-    # Load processor
-    processor = DonutProcessor.from_pretrained(MODEL_NAME)
+device = "cuda" if torch.cuda.is_available() else "cpu"
+
+# Model dan processor dimuat saat pertama dipakai (lazy), bukan saat import
+model = None
+processor = None
+backend = None
+_load_lock = threading.Lock()
+_load_attempted = False
+
+DONUT_BACKENDS = ("none", "int8", "onnx")
+
+
+def _load_eager(optimization: str):
+    from transformers import VisionEncoderDecoderModel
 
     # Load model (VisionEncoderDecoderModel instead of DonutModel)
-    model = VisionEncoderDecoderModel.from_pretrained(MODEL_NAME)
+    eager_model = VisionEncoderDecoderModel.from_pretrained(MODEL_NAME)
 
     # Send to device
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    model.to(device)
-    model.eval()
+    eager_model.to(device)
+    eager_model.eval()
+
+    if optimization == "int8":
+        if device != "cpu":
+            logger.warning("int8 dynamic quantization is CPU-only, using fp32 model")
+            return eager_model, "none"
+
+        # Kuantisasi dinamis int8 hanya untuk layer Linear di decoder;
+        # encoder Swin tetap fp32 agar akurasi pembacaan gambar terjaga
+        eager_model.decoder = torch.ao.quantization.quantize_dynamic(
+            eager_model.decoder, {torch.nn.Linear}, dtype=torch.qint8
+        )
 
-    logger.info(
-        f"Vision Encoder-Decoder model with DonutProcessor loaded successfully on {device}"
-    )
-except Exception as e:
-    logger.error(f"Failed to load Vision Encoder-Decoder model: {str(e)}")
-    model = None
-    processor = None
+    return eager_model, optimization
 
 
-def predict_from_image_path(image_path: str) -> Dict:
+def _load_onnx(onnx_dir: str = DONUT_ONNX_DIR):
+    """Load the ONNX export from ``onnx_dir``, exporting and saving it there first if missing."""
+    # optimum[onnxruntime] adalah dependency opsional
+    from optimum.onnxruntime import ORTModelForVision2Seq
+
+    if os.path.isfile(os.path.join(onnx_dir, "config.json")):
+        onnx_model = ORTModelForVision2Seq.from_pretrained(onnx_dir, use_cache=True)
+    else:
+        # Export encoder + decoder (dengan KV-cache) ke ONNX Runtime, sekali saja
+        logger.info(f"Exporting Donut to ONNX in {onnx_dir}")
+        onnx_model = ORTModelForVision2Seq.from_pretrained(
+            MODEL_NAME, export=True, use_cache=True
+        )
+        # Simpan ke direktori sementara lalu rename, agar export setengah jadi
+        # tidak terbaca sebagai export lengkap
+        tmp_dir = f"{onnx_dir}.tmp"
+        try:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            onnx_model.save_pretrained(tmp_dir)
+            shutil.rmtree(onnx_dir, ignore_errors=True)
+            os.replace(tmp_dir, onnx_dir)
+        except OSError as e:
+            logger.warning(
+                f"Failed to save ONNX export, it will be redone next start: {str(e)}"
+            )
+
+    onnx_model.to(device)
+    return onnx_model, "onnx"
+
+
+def load_model(optimization: Optional[str] = None, reload: bool = False):
     """
-    Process receipt image and extract structured data using Vision Encoder-Decoder Model.
+    Load the Donut processor and model into the module globals.
 
-    Args:
-        image_path: Path to the image file.
+    Safe to call from several threads; only the first call loads the weights.
+    A failed load is not retried so every request does not pay for it again.
 
-    Returns:
-        dict: Structured data from receipt.
+    Args:
+        optimization: Inference backend, one of ``DONUT_BACKENDS``. Defaults to
+            ``DONUT_OPTIMIZATION`` from config.
+        reload: Load again even if a model is already loaded (used by the
+            benchmark to switch backends).
     """
-    if not model or not processor:
-        logger.error("Model not loaded properly")
-        return {
-            "error": "Model not available",
-            "total": 0,
-            "category": "lainnya",
-            "date": None,
-            "note": "OCR model tidak tersedia",
-        }
+    global model, processor, backend, _load_attempted
+    if _load_attempted and not reload:
+        return model, processor
+
+    optimization = optimization or DONUT_OPTIMIZATION
+    if optimization not in DONUT_BACKENDS:
+        logger.warning(f"Unknown DONUT_OPTIMIZATION '{optimization}', using 'none'")
+        optimization = "none"
 
-    try:
-        # Load and preprocess image
-        image = Image.open(image_path).convert("RGB")
-
-        # Tokenize task prompt
-        decoder_input_ids = processor.tokenizer(
-            task_prompt, add_special_tokens=False, return_tensors="pt"
-        ).input_ids
-
-        # Preprocess image
-        pixel_values = processor(image, return_tensors="pt").pixel_values
-
-        # Move to device
-        pixel_values = pixel_values.to(device)
-        decoder_input_ids = decoder_input_ids.to(device)
-
-        # Generate
-        with torch.no_grad():
-            outputs = model.generate(
-                pixel_values,
-                decoder_input_ids=decoder_input_ids,
-                max_length=model.config.decoder.max_position_embeddings,
-                early_stopping=True,
-                pad_token_id=processor.tokenizer.pad_token_id,
+    with _load_lock:
+        if _load_attempted and not reload:
+            return model, processor
+
+        try:
+            from transformers import DonutProcessor
+
+            # Load processor
+            processor = DonutProcessor.from_pretrained(MODEL_NAME)
+
+            model = None
+            if optimization == "onnx":
+                try:
+                    model, backend = _load_onnx()
+                except ImportError:
+                    logger.warning(
+                        "optimum[onnxruntime] is not installed, using PyTorch model"
+                    )
+                except Exception as e:
+                    # Export/load ONNX gagal tidak boleh mematikan OCR
+                    logger.warning(f"ONNX backend failed, using PyTorch model: {str(e)}")
+                if model is None:
+                    optimization = "none"
+            if model is None:
+                model, backend = _load_eager(optimization)
+
+            logger.info(
+                f"Vision Encoder-Decoder model with DonutProcessor loaded successfully on {device} (backend: {backend})"
             )
+        except Exception as e:
+            logger.error(f"Failed to load Vision Encoder-Decoder model: {str(e)}")
+            model = None
+            processor = None
+            backend = None
+        finally:
+            _load_attempted = True
 
-        # Decode
-        sequence = processor.batch_decode(outputs, skip_special_tokens=True)[0]
+    return model, processor
 
-        logger.info(f"OCR raw result: {sequence}")
 
-        # Parse the structured output
-        parsed_data = parse_donut_output(sequence)
+def _error_result(error: str, note: str) -> Dict:
+    return {
+        "error": error,
+        "total": 0,
+        "category": "lainnya",
+        "date": None,
+        "note": note,
+    }
 
-        structured_result = {
-            "total": extract_total_amount(parsed_data),
-            "category": extract_category(parsed_data),
-            "date": extract_date(parsed_data),
-            "note": f"OCR dari struk - {parsed_data.get('store_name', 'Toko tidak diketahui')}",
-            "items": extract_items(parsed_data),
-            "raw_ocr": sequence,
-            "parsed_data": parsed_data,
-        }
 
-        logger.info(f"Structured result: {structured_result}")
-        return structured_result
-
-    except Exception as e:
-        logger.error(f"Error processing image: {str(e)}")
-        return {
-            "error": str(e),
-            "total": 0,
-            "category": "lainnya",
-            "date": None,
-            "note": f"Gagal memproses struk: {str(e)}",
-        }
+def _build_result(sequence: str) -> Dict:
+    """Turn one decoded Donut sequence into the structured receipt result."""
+    log_payload(logger, "OCR raw result", sequence)
+
+    # Parse the structured output
+    parsed_data = parse_donut_output(sequence)
+
+    structured_result = {
+        "total": extract_total_amount(parsed_data),
+        "category": extract_category(parsed_data),
+        "date": extract_date(parsed_data),
+        "note": f"OCR dari struk - {parsed_data.get('store_name', 'Toko tidak diketahui')}",
+        "items": extract_items(parsed_data),
+        "raw_ocr": sequence,
+        "parsed_data": parsed_data,
+    }
+
+    log_payload(logger, "Structured result", structured_result)
+    return structured_result
+
+
+def _target_size() -> Tuple[int, int]:
+    """Model input size as ``(width, height)`` from the Donut image processor."""
+    size = processor.image_processor.size
+    return size["width"], size["height"]
+
+
+def _stop_token_ids() -> List[int]:
+    """Token ids that end decoding: EOS plus the closing ``</s_total>`` tag."""
+    tokenizer = processor.tokenizer
+    stop_ids = [tokenizer.eos_token_id]
+    total_close_id = tokenizer.convert_tokens_to_ids(TOTAL_CLOSE_TAG)
+    if total_close_id is not None and total_close_id != tokenizer.unk_token_id:
+        stop_ids.append(total_close_id)
+    return stop_ids
+
+
+def _generate(images: List[Image.Image]) -> List[str]:
+    """Run one batched ``model.generate`` pass and return the decoded sequences."""
+    # Tokenize task prompt, sama untuk setiap gambar dalam batch
+    decoder_input_ids = processor.tokenizer(
+        task_prompt, add_special_tokens=False, return_tensors="pt"
+    ).input_ids.repeat(len(images), 1)
+
+    # Preprocess images (processor resize/pad ke ukuran input model yang sama)
+    pixel_values = processor(images, return_tensors="pt").pixel_values
+
+    # Move to device
+    pixel_values = pixel_values.to(device)
+    decoder_input_ids = decoder_input_ids.to(device)
+
+    # Batas token yang wajar untuk struk, tetap di bawah kapasitas posisi decoder
+    max_new_tokens = min(
+        DONUT_MAX_NEW_TOKENS,
+        model.config.decoder.max_position_embeddings - decoder_input_ids.shape[1],
+    )
+
+    # Generate: greedy dengan KV cache, berhenti per-sequence saat </s_total>
+    # (bagian terakhir skema CORD) atau EOS muncul
+    with torch.no_grad():
+        outputs = model.generate(
+            pixel_values,
+            decoder_input_ids=decoder_input_ids,
+            max_new_tokens=max_new_tokens,
+            num_beams=1,
+            do_sample=False,
+            use_cache=True,
+            eos_token_id=_stop_token_ids(),
+            pad_token_id=processor.tokenizer.pad_token_id,
+            bad_words_ids=[[processor.tokenizer.unk_token_id]],
+        )
 
+    # Decode (padding di akhir sequence yang lebih pendek ikut dibuang)
+    return processor.batch_decode(outputs, skip_special_tokens=True)
 
-def parse_donut_output(sequence: str) -> Dict:
+
+ImageSource = Union[str, bytes, Image.Image]
+
+
+def predict_from_images(sources: List[ImageSource]) -> List[Dict]:
     """
-    Parse Donut model output with structured tags.
+    Process several receipt images in a single batched inference pass.
 
     Args:
-        sequence: Raw output from Donut model with structured tags
+        sources: Image file paths, raw image bytes or PIL images.
 
     Returns:
-        dict: Parsed structured data
+        list: One structured result per input, in the same order. Images
+        that cannot be opened get an error result without failing the batch.
     """
-    parsed_data = {
-        "store_name": "",
-        "items": [],
-        "total": 0,
-        "subtotal": 0,
-        "tax": 0,
-        "service_charge": 0,
-        "discount": 0,
-        "date": None,
-        "raw_sequence": sequence,
-    }
+    load_model()
+    if not model or not processor:
+        logger.error("Model not loaded properly")
+        return [
+            _error_result("Model not available", "OCR model tidak tersedia")
+            for _ in sources
+        ]
 
-    try:
-        # Extract store name (usually first <s_nm> tag)
-        store_match = re.search(r"<s_nm>\s*([^<]+)", sequence)
-        if store_match:
-            parsed_data["store_name"] = store_match.group(1).strip()
-
-        # Extract menu items
-        items = []
-        # Find all menu items between <s_menu> tags
-        menu_section = re.search(r"<s_menu>(.*?)</s_menu>", sequence, re.DOTALL)
-        if menu_section:
-            menu_content = menu_section.group(1)
-
-            # Split by <sep/> to get individual items
-            item_sections = menu_content.split("<sep/>")
-
-            for item_section in item_sections:
-                item = {}
-
-                # Extract item name
-                name_match = re.search(r"<s_nm>\s*([^<]+)", item_section)
-                if name_match:
-                    item["name"] = name_match.group(1).strip()
-
-                # Extract unit price
-                unitprice_match = re.search(r"<s_unitprice>\s*([^<]+)", item_section)
-                if unitprice_match:
-                    item["unit_price"] = unitprice_match.group(1).strip()
-
-                # Extract count
-                cnt_match = re.search(r"<s_cnt>\s*([^<]+)", item_section)
-                if cnt_match:
-                    item["count"] = cnt_match.group(1).strip()
-
-                # Extract price
-                price_match = re.search(r"<s_price>\s*([^<]+)", item_section)
-                if price_match:
-                    item["price"] = price_match.group(1).strip()
-
-                if item.get("name"):  # Only add if we have at least a name
-                    items.append(item)
-
-        parsed_data["items"] = items
-
-        # Extract subtotal information
-        subtotal_section = re.search(
-            r"<s_sub_total>(.*?)</s_sub_total>", sequence, re.DOTALL
-        )
-        if subtotal_section:
-            subtotal_content = subtotal_section.group(1)
+    results: List[Optional[Dict]] = [None] * len(sources)
+    images = []
+    positions = []
+    for i, source in enumerate(sources):
+        try:
+            # Load and preprocess image (orientasi, downscale, crop, deskew)
+            images.append(preprocess_receipt(source, _target_size()))
+            positions.append(i)
+        except Exception as e:
+            logger.error(f"Error opening image #{i}: {str(e)}")
+            results[i] = _error_result(str(e), f"Gagal memproses struk: {str(e)}")
+
+    if images:
+        try:
+            sequences = _generate(images)
+            for i, sequence in zip(positions, sequences):
+                results[i] = _build_result(sequence)
+        except Exception as e:
+            logger.error(f"Error processing image: {str(e)}")
+            for i in positions:
+                results[i] = _error_result(
+                    str(e), f"Gagal memproses struk: {str(e)}"
+                )
 
-            # Extract subtotal price
-            subtotal_match = re.search(
-                r"<s_subtotal_price>\s*([^<]+)", subtotal_content
-            )
-            if subtotal_match:
-                parsed_data["subtotal"] = subtotal_match.group(1).strip()
+    return results
 
-            # Extract discount
-            discount_match = re.search(
-                r"<s_discount_price>\s*([^<]+)", subtotal_content
-            )
-            if discount_match:
-                parsed_data["discount"] = discount_match.group(1).strip()
-
-            # Extract service charge
-            service_match = re.search(r"<s_service_price>\s*([^<]+)", subtotal_content)
-            if service_match:
-                parsed_data["service_charge"] = service_match.group(1).strip()
-
-            # Extract tax
-            tax_match = re.search(r"<s_tax_price>\s*([^<]+)", subtotal_content)
-            if tax_match:
-                parsed_data["tax"] = tax_match.group(1).strip()
-
-        # Extract total
-        total_section = re.search(r"<s_total>(.*?)</s_total>", sequence, re.DOTALL)
-        if total_section:
-            total_content = total_section.group(1)
-
-            # Extract total price
-            total_match = re.search(r"<s_total_price>\s*([^<]+)", total_content)
-            if total_match:
-                parsed_data["total"] = total_match.group(1).strip()
-
-        # Try to extract date from various fields
-        date_patterns = [
-            r"\d{2}\.\d{2}\.\d{4}",  # DD.MM.YYYY
-            r"\d{1,2}/\d{1,2}/\d{4}",  # D/M/YYYY or DD/MM/YYYY
-            r"\d{4}-\d{2}-\d{2}",  # YYYY-MM-DD
-        ]
 
-        for pattern in date_patterns:
-            date_match = re.search(pattern, sequence)
-            if date_match:
-                parsed_data["date"] = date_match.group()
-                break
+def predict_from_image(image: Image.Image) -> Dict:
+    """Process a receipt that is already decoded as a PIL image."""
+    return predict_from_images([image])[0]
 
-    except Exception as e:
-        logger.error(f"Error parsing Donut output: {str(e)}")
 
-    return parsed_data
+def predict_from_bytes(data: bytes) -> Dict:
+    """Process a receipt straight from the uploaded bytes, without a temp file."""
+    return predict_from_images([data])[0]
 
 
-def extract_total_amount(result: Dict) -> float:
-    """Extract total amount from parsed result."""
-    # Try to get total from parsed data
-    total_str = result.get("total", "")
-    if total_str:
-        try:
-            # Clean up the total string - remove non-numeric characters except comma and dot
-            clean_total = re.sub(r"[^\d.,]", "", str(total_str))
-
-            # Handle Indonesian number format where comma is thousands separator
-            # and dot is decimal separator
-            if "," in clean_total and "." in clean_total:
-                # Both comma and dot present - comma is thousands, dot is decimal
-                clean_total = clean_total.replace(",", "")
-            elif "," in clean_total and "." not in clean_total:
-                # Only comma present - it's thousands separator in Indonesian format
-                clean_total = clean_total.replace(",", "")
-            # If only dot present, keep it as decimal separator
-
-            return float(clean_total)
-        except (ValueError, TypeError):
-            pass
+def predict_from_image_paths(image_paths: List[str]) -> List[Dict]:
+    """Process several receipt image files in a single batched inference pass."""
+    return predict_from_images(image_paths)
 
-    # Try subtotal if total not found
-    subtotal_str = result.get("subtotal", "")
-    if subtotal_str:
-        try:
-            clean_subtotal = re.sub(r"[^\d.,]", "", str(subtotal_str))
 
-            # Handle Indonesian number format
-            if "," in clean_subtotal and "." in clean_subtotal:
-                clean_subtotal = clean_subtotal.replace(",", "")
-            elif "," in clean_subtotal and "." not in clean_subtotal:
-                clean_subtotal = clean_subtotal.replace(",", "")
+def predict_from_image_path(image_path: str) -> Dict:
+    """
+    Process receipt image and extract structured data using Vision Encoder-Decoder Model.
+
+    Args:
+        image_path: Path to the image file.
 
-            return float(clean_subtotal)
-        except (ValueError, TypeError):
-            pass
+    Returns:
+        dict: Structured data from receipt.
+    """
+    return predict_from_images([image_path])[0]
 
-    # Try to extract from items
-    items = result.get("items", [])
-    total = 0
-    for item in items:
-        if "price" in item:
-            try:
-                price_str = re.sub(r"[^\d.,]", "", str(item["price"]))
 
-                # Handle Indonesian number format
-                if "," in price_str and "." in price_str:
-                    price_str = price_str.replace(",", "")
-                elif "," in price_str and "." not in price_str:
-                    price_str = price_str.replace(",", "")
+def extract_total_amount(result: Dict) -> float:
+    """Extract total amount from parsed result."""
+    # Try to get total from parsed data
+    total = parse_amount(result.get("total"))
+    if total:
+        return total
 
-                total += float(price_str)
-            except (ValueError, TypeError):
-                continue
+    # Try subtotal if total not found
+    subtotal = parse_amount(result.get("subtotal"))
+    if subtotal:
+        return subtotal
 
-    return total
+    # Try to extract from items
+    return sum(parse_amount(item.get("price")) or 0 for item in result.get("items", []))
 
 
 def extract_category(result: Dict) -> str:
     """Extract category based on store name or items."""
-    store_name = result.get("store_name", "").lower()
-
-    # Check store name patterns
-    if any(
-        keyword in store_name
-        for keyword in [
-            "market",
-            "grocery",
-            "supermarket",
-            "minimarket",
-            "indomaret",
-            "alfamart",
-        ]
-    ):
-        return "belanja"
-    elif any(
-        keyword in store_name
-        for keyword in [
-            "restaurant",
-            "cafe",
-            "food",
-            "resto",
-            "warung",
-            "makan",
-            "hotel",
-            "berghotel",
-        ]
-    ):
-        return "makanan"
-    elif any(
-        keyword in store_name
-        for keyword in ["gas", "fuel", "petrol", "pertamina", "shell", "spbu"]
-    ):
-        return "transportasi"
-    elif any(
-        keyword in store_name
-        for keyword in ["pharmacy", "medical", "hospital", "apotek", "kimia farma"]
-    ):
-        return "kesehatan"
-
-    # Check items for food/drink keywords
-    items = result.get("items", [])
-    food_keywords = [
-        "coffee",
-        "latte",
-        "macchiato",
-        "tea",
-        "drink",
-        "food",
-        "meal",
-        "schweizer",
-        "chasspatri",
-    ]
-    for item in items:
-        item_name = item.get("name", "").lower()
-        if any(keyword in item_name for keyword in food_keywords):
-            return "makanan"
-
-    return "lainnya"
+    item_names = (item.get("name", "") for item in result.get("items", []))
+    return get_classifier().classify(result.get("store_name", ""), item_names)
 
 
 def extract_date(result: Dict) -> Optional[str]:
-    """Extract date from parsed result."""
+    """Extract date from parsed result (already searched by parse_donut_output)."""
     if "date" in result and result["date"]:
         return str(result["date"])
 
-    # Try to extract from raw sequence
-    if "raw_sequence" in result:
-        date_patterns = [
-            r"\d{2}\.\d{2}\.\d{4}",  # DD.MM.YYYY
-            r"\d{1,2}/\d{1,2}/\d{4}",  # D/M/YYYY or DD/MM/YYYY
-            r"\d{4}-\d{2}-\d{2}",  # YYYY-MM-DD
-        ]
-
-        for pattern in date_patterns:
-            match = re.search(pattern, result["raw_sequence"])
-            if match:
-                return match.group()
-
     return None
 
 
@@ -0,0 +1,226 @@
+# app/ai_models/donut_parser.py
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Satu pola untuk semua token output Donut: leaf lengkap <s_x>teks</s_x> (paling
+# sering, jadi dicocokkan sekaligus), tag buka/tutup, pemisah <sep/>, token khusus
+# lain (<s>, </s>, <pad>, ...) dan teks biasa.
+# Grup: (nama leaf, teks leaf, tanda tutup, nama tag, sep, teks)
+TOKEN_PATTERN = re.compile(
+    r"<s_([^<>/]+)>([^<]*)</s_\1>"
+    r"|<(/?)s_([^<>/]+)>"
+    r"|(<sep/>)"
+    r"|<[^<>]*>"
+    r"|([^<]+)"
+)
+
+DATE_PATTERN = re.compile(
+    r"\d{2}\.\d{2}\.\d{4}"  # DD.MM.YYYY
+    r"|\d{1,2}/\d{1,2}/\d{4}"  # D/M/YYYY or DD/MM/YYYY
+    r"|\d{4}-\d{2}-\d{2}"  # YYYY-MM-DD
+)
+
+# Tag prompt task, bukan bagian dari struktur struk
+TASK_TAGS = {"cord-v2"}
+
+
+class _Frame:
+    __slots__ = ("key", "values", "fields", "text")
+
+    def __init__(self, key: Optional[str]):
+        self.key = key
+        self.values: List[Any] = []
+        self.fields: Dict[str, Any] = {}
+        self.text: List[str] = []
+
+    def flush(self):
+        """Finish the current entry (separated by <sep/>) and start a new one."""
+        if self.fields:
+            if self.text:
+                self.fields.setdefault("text", " ".join(self.text))
+            self.values.append(self.fields)
+            self.fields = {}
+        elif self.text:
+            self.values.append(" ".join(self.text))
+        if self.text:
+            self.text = []
+
+    def value(self) -> Any:
+        self.flush()
+        if not self.values:
+            return None
+        return self.values[0] if len(self.values) == 1 else self.values
+
+    def add(self, key: str, value: Any):
+        if value is None:
+            return
+        fields = self.fields
+        if key not in fields:
+            fields[key] = value
+        elif isinstance(fields[key], list):
+            fields[key].append(value)
+        else:
+            fields[key] = [fields[key], value]
+
+
+def build_tree(sequence: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Build the nested field tree of a Donut sequence in linear time.
+
+    The sequence is tokenized once with ``TOKEN_PATTERN``. Tolerates the usual
+    generation glitches: leaf tags without a closing tag, stray closing tags
+    and output cut off before every tag is closed.
+
+    Returns:
+        tuple: ``(tree, first_nm)`` where ``first_nm`` is the first ``nm`` text
+        in document order (used as the store name).
+    """
+    root = _Frame(None)
+    stack = [root]
+    open_keys: Dict[str, int] = {}
+    top = root
+    first_nm = None
+
+    for leaf_key, leaf_text, close, key, sep, text in TOKEN_PATTERN.findall(sequence):
+        if leaf_key or (key and not close):
+            if (leaf_key or key) in TASK_TAGS:
+                continue
+            # Leaf sebelumnya yang belum ditutup (sudah berisi teks) ditutup otomatis
+            if top.text and not top.fields and top is not root:
+                stack.pop()
+                open_keys[top.key] -= 1
+                stack[-1].add(top.key, top.value())
+                top = stack[-1]
+
+            if leaf_key:
+                leaf_text = leaf_text.strip()
+                if leaf_text:
+                    top.add(leaf_key, leaf_text)
+                    if first_nm is None and leaf_key == "nm":
+                        first_nm = leaf_text
+            else:
+                top = _Frame(key)
+                stack.append(top)
+                open_keys[key] = open_keys.get(key, 0) + 1
+        elif text:
+            text = text.strip()
+            if text:
+                top.text.append(text)
+                if first_nm is None and top.key == "nm":
+                    first_nm = text
+        elif key:
+            # Tutup semua frame sampai tag yang cocok; tag tutup tanpa pasangan diabaikan
+            if open_keys.get(key):
+                while True:
+                    frame = stack.pop()
+                    open_keys[frame.key] -= 1
+                    stack[-1].add(frame.key, frame.value())
+                    if frame.key == key:
+                        break
+                top = stack[-1]
+        elif sep:
+            top.flush()
+
+    # Output terpotong: tutup semua tag yang masih terbuka
+    while len(stack) > 1:
+        frame = stack.pop()
+        stack[-1].add(frame.key, frame.value())
+
+    tree = root.value()
+    return (tree if isinstance(tree, dict) else {}), first_nm
+
+
+def _text(value: Any, default: Any = "") -> Any:
+    """Return the first text value of a field that may be a list or a dict."""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = value.get("text")
+    return value if value is not None else default
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def parse_donut_output(sequence: str) -> Dict:
+    """
+    Parse Donut model output with structured tags.
+
+    Args:
+        sequence: Raw output from Donut model with structured tags
+
+    Returns:
+        dict: Parsed structured data. ``fields`` holds the complete tag tree,
+        including CORD fields that have no dedicated key.
+    """
+    parsed_data = {
+        "store_name": "",
+        "items": [],
+        "total": 0,
+        "subtotal": 0,
+        "tax": 0,
+        "service_charge": 0,
+        "discount": 0,
+        "date": None,
+        "raw_sequence": sequence,
+        "fields": {},
+    }
+
+    try:
+        tree, first_nm = build_tree(sequence)
+        parsed_data["fields"] = tree
+        parsed_data["store_name"] = first_nm or ""
+
+        # Menu items, dipisahkan <sep/> di dalam <s_menu>
+        items = []
+        for entry in _as_list(tree.get("menu")):
+            if not isinstance(entry, dict):
+                continue
+            item = {}
+            for source, target in (
+                ("nm", "name"),
+                ("unitprice", "unit_price"),
+                ("cnt", "count"),
+                ("price", "price"),
+            ):
+                value = _text(entry.get(source), None)
+                if value is not None:
+                    item[target] = value
+            if item.get("name"):  # Only add if we have at least a name
+                items.append(item)
+        parsed_data["items"] = items
+
+        # Subtotal information
+        sub_total = tree.get("sub_total")
+        if isinstance(sub_total, dict):
+            for source, target in (
+                ("subtotal_price", "subtotal"),
+                ("discount_price", "discount"),
+                ("service_price", "service_charge"),
+                ("tax_price", "tax"),
+            ):
+                value = _text(sub_total.get(source), None)
+                if value is not None:
+                    parsed_data[target] = value
+
+        # Total
+        total = tree.get("total")
+        if isinstance(total, dict):
+            value = _text(total.get("total_price"), None)
+            if value is not None:
+                parsed_data["total"] = value
+
+        date_match = DATE_PATTERN.search(sequence)
+        if date_match:
+            parsed_data["date"] = date_match.group()
+
+    except Exception as e:
+        logger.error(f"Error parsing Donut output: {str(e)}")
+
+    return parsed_data
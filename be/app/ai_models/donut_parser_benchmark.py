@@ -0,0 +1,64 @@
+# app/ai_models/donut_parser_benchmark.py
+"""
+Micro-benchmark for parse_donut_output.
+
+Usage::
+
+    python -m app.ai_models.donut_parser_benchmark [sequences.txt] [--repeat N]
+
+``sequences.txt`` holds one recorded Donut sequence per line (e.g. ``raw_ocr``
+values from scan responses). Without it a few built-in samples are used.
+"""
+import argparse
+import time
+from pathlib import Path
+
+from app.ai_models.donut_parser import parse_donut_output
+
+SAMPLE_SEQUENCES = [
+    "<s_menu><s_nm> Nasi Goreng</s_nm><s_cnt> 2</s_cnt><s_unitprice> 25.000</s_unitprice>"
+    "<s_price> 50.000</s_price><sep/><s_nm> Es Teh Manis</s_nm><s_cnt> 1</s_cnt>"
+    "<s_price> 5.000</s_price></s_menu><s_sub_total><s_subtotal_price> 55.000</s_subtotal_price>"
+    "<s_tax_price> 5.500</s_tax_price></s_sub_total><s_total><s_total_price> 60.500</s_total_price>"
+    "<s_cashprice> 100.000</s_cashprice><s_changeprice> 39.500</s_changeprice></s_total>",
+    "<s_menu><s_nm> Caffe Latte</s_nm><s_cnt> 1</s_cnt><s_price> 45,000</s_price><sep/>"
+    "<s_nm> Croissant</s_nm><s_cnt> 2</s_cnt><s_price> 60,000</s_price><sep/>"
+    "<s_nm> Mineral Water</s_nm><s_cnt> 1</s_cnt><s_price> 12,000</s_price></s_menu>"
+    "<s_sub_total><s_subtotal_price> 117,000</s_subtotal_price><s_service_price> 5,850</s_service_price>"
+    "<s_tax_price> 12,285</s_tax_price></s_sub_total><s_total><s_total_price> 135,135</s_total_price>"
+    "</s_total> 12/05/2024",
+    "<s_menu><s_nm> Indomie Goreng<s_cnt> 5</s_cnt><s_price> 15.500</s_price></s_menu>"
+    "<s_total><s_total_price> Rp 15.500",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("sequences", nargs="?", type=Path)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    sequences = SAMPLE_SEQUENCES
+    if args.sequences:
+        sequences = [
+            line
+            for line in args.sequences.read_text(encoding="utf-8").splitlines()
+            if line.strip()
+        ]
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for sequence in sequences:
+            parse_donut_output(sequence)
+    elapsed = time.perf_counter() - start
+
+    calls = args.repeat * len(sequences)
+    total_chars = args.repeat * sum(len(s) for s in sequences)
+    print(
+        f"{calls} parses in {elapsed:.3f} s: {elapsed / calls * 1e6:.1f} us/parse, "
+        f"{total_chars / elapsed / 1e6:.1f} MB/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
 import json
+import logging
 import os
 from typing import Dict, List, Optional
 
 import google.generativeai as genai
 from app.config import GEMINI_API_KEY
-from app.database import fetch_data
+from app.database import Query, fetch_data
+from app.utils.log import log_payload
+from app.utils.metrics import span
+
+logger = logging.getLogger(__name__)
 
 genai.configure(api_key=os.getenv(GEMINI_API_KEY))
 MODEL_NAME = "gemini-1.5-flash"
@@ -19,15 +24,15 @@ async def get_user_context(user_id: str) -> Dict:
     """Mengambil konteks user dari database untuk membuat AI lebih personal"""
     try:
         # Ambil data transaksi terbaru (30 hari terakhir)
-        transactions = await fetch_data(
-            "transactions", f"&user_id=eq.{user_id}&order=created_at.desc&limit=20"
+        recent = (
+            Query("transactions")
+            .eq("user_id", user_id)
+            .order("created_at", desc=True)
         )
+        transactions = await fetch_data(recent.limit(20))
 
         # Ambil data kategori yang sering digunakan
-        categories_data = await fetch_data(
-            "transactions",
-            f"&user_id=eq.{user_id}&select=category&order=created_at.desc&limit=50",
-        )
+        categories_data = await fetch_data(recent.select("category").limit(50))
 
         # Hitung total income dan expense
         total_income = sum(t["amount"] for t in transactions if t["type"] == "income")
@@ -49,7 +54,7 @@ async def get_user_context(user_id: str) -> Dict:
             "transaction_count": len(transactions),
         }
     except Exception as e:
-        print(f"Error getting user context: {e}")
+        logger.warning(f"Error getting user context: {e}")
         return {}
 
 
@@ -132,7 +137,8 @@ async def ask_gemini_with_history(history: list, message: str, user_id: str = No
             )
 
         chat = create_chat_session(enhanced_history)
-        response = chat.send_message(message)
+        with span("gemini", "chat"):
+            response = chat.send_message(message)
         return response.text
     except Exception as e:
         return f"Error: {str(e)}"
@@ -153,13 +159,16 @@ async def ask_gemini(prompt: str, user_id: str = None) -> str:
         full_prompt = f"{system_prompt}\n\nPERTANYaan USER: {prompt}"
 
         model = genai.GenerativeModel(MODEL_NAME)
-        response = model.generate_content(full_prompt)
+        with span("gemini", "generate"):
+            response = model.generate_content(full_prompt)
         return response.text
     except Exception as e:
         return f"Error: {str(e)}"
 
 
-async def parse_transaction_with_gemini(text: str, user_id: str = None):
+async def parse_transaction_with_gemini(
+    text: str, user_id: str = None, category_hint: Optional[str] = None
+):
     """Enhanced version yang menggunakan konteks user untuk parsing yang lebih akurat"""
 
     # Ambil konteks user untuk kategori yang sering digunakan
@@ -173,6 +182,11 @@ async def parse_transaction_with_gemini(text: str, user_id: str = None):
         if common_categories
         else ""
     )
+    if category_hint:
+        categories_hint += (
+            f"\nTebakan kategori dari riwayat transaksi user: {category_hint} "
+            "(gunakan jika sesuai dengan kalimat)"
+        )
 
     prompt = f"""
 Kamu adalah sistem keuangan pintar yang memahami kebiasaan user. Dari kalimat berikut ini, ekstrak dalam format output yang akan ditentukan:
@@ -198,7 +212,7 @@ Kalimat: {text}
 """
 
     result = await ask_gemini(prompt, user_id)
-    print(f"Output Gemini: {result}")
+    log_payload(logger, "Output Gemini", result)
 
     # Coba ekstrak JSON dari response
     try:
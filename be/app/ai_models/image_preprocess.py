@@ -0,0 +1,143 @@
+# app/ai_models/image_preprocess.py
+import io
+import logging
+from typing import Tuple, Union
+
+import numpy as np
+from app.config import OCR_CROP, OCR_DESKEW, OCR_PREPROCESS
+from PIL import Image, ImageFilter, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Ukuran kerja untuk analisis crop/deskew; cukup kecil agar murah
+ANALYSIS_SIZE = 256
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.5
+
+
+def open_image(source: Union[str, bytes, io.IOBase, Image.Image]) -> Image.Image:
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    return Image.open(source)
+
+
+def preprocess_receipt(
+    source: Union[str, bytes, io.IOBase, Image.Image],
+    target_size: Tuple[int, int],
+) -> Image.Image:
+    """
+    Prepare a receipt photo for Donut.
+
+    Fixes EXIF orientation, decodes JPEGs at reduced resolution, crops to the
+    receipt, downscales to the model input size and straightens small skews.
+
+    Args:
+        source: Path, raw bytes, file object or PIL image.
+        target_size: Model input size as ``(width, height)``.
+
+    Returns:
+        Image.Image: RGB image no larger than ``target_size``.
+    """
+    image = open_image(source)
+    if not OCR_PREPROCESS:
+        return image.convert("RGB")
+
+    # JPEG bisa langsung di-decode pada skala 1/2, 1/4 atau 1/8 (jauh lebih cepat).
+    # Ukuran diminta persegi agar tetap cukup besar setelah rotasi EXIF.
+    if image.format == "JPEG":
+        side = max(target_size)
+        image.draft("RGB", (side, side))
+
+    image = ImageOps.exif_transpose(image).convert("RGB")
+
+    if OCR_CROP:
+        image = _crop_to_receipt(image)
+
+    image = _downscale(image, target_size)
+
+    if OCR_DESKEW:
+        # Rotasi dengan expand=True sedikit memperbesar kanvas; muatkan lagi ke
+        # target_size (thumbnail pada gambar kecil ini murah)
+        image = _deskew(image)
+        image.thumbnail(target_size, Image.Resampling.LANCZOS)
+
+    return image
+
+
+def _downscale(image: Image.Image, target_size: Tuple[int, int]) -> Image.Image:
+    target_w, target_h = target_size
+    factor = max(image.width / target_w, image.height / target_h)
+    if factor >= 2:
+        # reduce() adalah box filter integer yang murah untuk faktor besar
+        image = image.reduce(int(factor))
+    image.thumbnail(target_size, Image.Resampling.LANCZOS)
+    return image
+
+
+def _analysis_view(image: Image.Image) -> Tuple[Image.Image, float]:
+    gray = image.convert("L")
+    scale = ANALYSIS_SIZE / max(gray.size)
+    if scale < 1:
+        gray = gray.resize(
+            (max(1, int(gray.width * scale)), max(1, int(gray.height * scale))),
+            Image.Resampling.BILINEAR,
+        )
+    else:
+        scale = 1.0
+    return ImageOps.autocontrast(gray), scale
+
+
+def _crop_to_receipt(image: Image.Image) -> Image.Image:
+    """Crop to the bright paper region when it clearly stands out from the background."""
+    gray, scale = _analysis_view(image)
+
+    # Kertas struk terang; erosi menghapus bintik terang kecil di latar
+    mask = gray.point(lambda p: 255 if p > 160 else 0).filter(ImageFilter.MinFilter(5))
+    bbox = mask.getbbox()
+    if not bbox:
+        return image
+
+    left, top, right, bottom = bbox
+    area_ratio = ((right - left) * (bottom - top)) / (gray.width * gray.height)
+    # Jangan crop jika hampir seluruh gambar terang atau area terlalu kecil
+    if area_ratio > 0.9 or area_ratio < 0.2:
+        return image
+
+    margin = int(0.02 * max(gray.size))
+    left = max(0, left - margin) / scale
+    top = max(0, top - margin) / scale
+    right = min(gray.width, right + margin) / scale
+    bottom = min(gray.height, bottom + margin) / scale
+    return image.crop((int(left), int(top), int(right), int(bottom)))
+
+
+def _deskew(image: Image.Image) -> Image.Image:
+    """Rotate by the angle that makes text rows most sharply separated."""
+    gray, _ = _analysis_view(image)
+
+    # Teks gelap menjadi foreground (1)
+    ink = gray.point(lambda p: 255 if p < 128 else 0)
+
+    best_angle = 0.0
+    best_score = -1.0
+    steps = int(DESKEW_MAX_ANGLE / DESKEW_STEP)
+    for i in range(-steps, steps + 1):
+        angle = i * DESKEW_STEP
+        rotated = np.asarray(ink.rotate(angle, resample=Image.Resampling.NEAREST))
+        # Variansi profil baris paling tinggi saat baris teks horizontal
+        score = float(np.var(rotated.sum(axis=1, dtype=np.float64)))
+        if score > best_score:
+            best_angle, best_score = angle, score
+
+    if abs(best_angle) < DESKEW_STEP:
+        return image
+
+    logger.debug(f"Deskewing receipt by {best_angle} degrees")
+    return image.rotate(
+        best_angle,
+        resample=Image.Resampling.BICUBIC,
+        expand=True,
+        fillcolor=(255, 255, 255),
+    )
@@ -0,0 +1,200 @@
+# app/ai_models/model_server.py
+"""
+Shared inference process for the heavy models (Donut OCR and Whisper).
+
+With ``uvicorn --workers N`` every worker would otherwise hold its own copy of
+the weights. When ``INFERENCE_SERVER_ADDRESS`` is set, API workers forward
+inference requests over a local IPC connection to a single process started
+with::
+
+    python -m app.ai_models.model_server
+
+When it is not set, inference runs in-process exactly as before.
+"""
+import logging
+import queue
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from typing import Dict, List, Union
+
+from app.config import (
+    ENABLE_OCR,
+    ENABLE_VOICE,
+    INFERENCE_SERVER_ADDRESS,
+    INFERENCE_SERVER_AUTHKEY,
+    INFERENCE_SERVER_QUEUE,
+    INFERENCE_SERVER_WORKERS,
+    OCR_TIMEOUT_SECONDS,
+    VOICE_TIMEOUT_SECONDS,
+)
+from app.utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_address(address: str):
+    """Turn ``host:port`` into a TCP address tuple, anything else is a unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def _authkey() -> bytes:
+    if not INFERENCE_SERVER_AUTHKEY:
+        raise RuntimeError(
+            "INFERENCE_SERVER_AUTHKEY wajib diatur bila INFERENCE_SERVER_ADDRESS dipakai"
+        )
+    return INFERENCE_SERVER_AUTHKEY.encode()
+
+
+def _call_server(task: str, *args, timeout: float):
+    # Tanpa batas waktu thread executor akan menunggu selamanya bila server macet,
+    # padahal request-nya sudah dijawab 504; koneksi ditutup saat keluar dari with
+    with Client(_parse_address(INFERENCE_SERVER_ADDRESS), authkey=_authkey()) as conn:
+        conn.send((task, args))
+        if not conn.poll(timeout):
+            raise TimeoutError(f"Inference server did not answer {task} in {timeout}s")
+        status, payload = conn.recv()
+
+    if status == "error":
+        raise Exception(payload)
+    return payload
+
+
+# Satu inference per model pada satu waktu: Whisper memasang hook kv-cache di
+# modul decoder bersama, dan generate Donut paralel hanya berebut core CPU
+_model_locks = {"donut": threading.Lock(), "whisper": threading.Lock()}
+
+
+def _run_local(task: str, *args):
+    if task == "ocr":
+        from app.ai_models.donut_loader import predict_from_images
+
+        with _model_locks["donut"]:
+            return predict_from_images([args[0]])[0]
+    if task == "ocr_batch":
+        from app.ai_models.donut_loader import predict_from_images
+
+        with _model_locks["donut"]:
+            return predict_from_images(args[0])
+    if task == "transcribe":
+        from app.ai_models.whisper_model import transcribe_bytes
+
+        with _model_locks["whisper"]:
+            return transcribe_bytes(*args)
+    raise ValueError(f"Unknown inference task: {task}")
+
+
+def run_ocr(image: Union[str, bytes], timeout: float = OCR_TIMEOUT_SECONDS) -> Dict:
+    """Run Donut OCR on an image path or raw bytes, in the shared inference process if configured."""
+    with span("donut", "ocr"):
+        if INFERENCE_SERVER_ADDRESS:
+            return _call_server("ocr", image, timeout=timeout)
+        return _run_local("ocr", image)
+
+
+def run_ocr_batch(
+    images: List[Union[str, bytes]], timeout: float = OCR_TIMEOUT_SECONDS
+) -> List[Dict]:
+    """Run Donut OCR on several images in one batched pass."""
+    with span("donut", "ocr_batch"):
+        if INFERENCE_SERVER_ADDRESS:
+            return _call_server("ocr_batch", images, timeout=timeout)
+        return _run_local("ocr_batch", images)
+
+
+def run_transcription(
+    audio: bytes, suffix: str, timeout: float = VOICE_TIMEOUT_SECONDS
+) -> str:
+    """
+    Transcribe raw audio bytes, in the shared inference process if configured.
+
+    The bytes (not a path) are sent so the process that transcribes owns the
+    temporary file and the caller giving up cannot delete it mid-read.
+    """
+    with span("whisper", "transcribe"):
+        if INFERENCE_SERVER_ADDRESS:
+            return _call_server("transcribe", audio, suffix, timeout=timeout)
+        return _run_local("transcribe", audio, suffix)
+
+
+def _handle_connection(conn):
+    with conn:
+        try:
+            task, args = conn.recv()
+            conn.send(("ok", _run_local(task, *args)))
+        except EOFError:
+            pass
+        except Exception as e:
+            logger.error(f"Inference task failed: {str(e)}")
+            try:
+                conn.send(("error", str(e)))
+            except OSError:
+                pass
+
+
+def _reject_busy(conn):
+    with conn:
+        try:
+            conn.send(("error", "Inference server is busy"))
+        except OSError:
+            pass
+
+
+def _worker(connections: "queue.Queue"):
+    while True:
+        _handle_connection(connections.get())
+
+
+def serve(address: str = INFERENCE_SERVER_ADDRESS):
+    """Load the models once and serve inference requests until interrupted."""
+    if not address:
+        raise SystemExit("INFERENCE_SERVER_ADDRESS belum diatur")
+    if not INFERENCE_SERVER_AUTHKEY:
+        raise SystemExit("INFERENCE_SERVER_AUTHKEY belum diatur")
+
+    # Muat model sekali di proses ini, bukan di tiap worker API
+    if ENABLE_OCR:
+        from app.ai_models import donut_loader
+
+        donut_loader.load_model()
+    if ENABLE_VOICE:
+        from app.ai_models import whisper_model
+
+        whisper_model.get_model()
+
+    # Koneksi diproses dari antrean oleh jumlah worker tetap; saat antrean penuh
+    # klien langsung ditolak agar tidak menunggu tanpa batas di handshake
+    connections: "queue.Queue" = queue.Queue(maxsize=INFERENCE_SERVER_QUEUE)
+    for i in range(INFERENCE_SERVER_WORKERS):
+        threading.Thread(
+            target=_worker, args=(connections,), name=f"inference-{i}", daemon=True
+        ).start()
+
+    with Listener(_parse_address(address), authkey=_authkey()) as listener:
+        logger.info(
+            f"Inference server listening on {address} "
+            f"({INFERENCE_SERVER_WORKERS} workers)"
+        )
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError, OSError) as e:
+                logger.warning(f"Rejected inference connection: {str(e)}")
+                continue
+            try:
+                connections.put_nowait(conn)
+            except queue.Full:
+                _reject_busy(conn)
+
+
+if __name__ == "__main__":
+    from app.utils.log import setup_logging
+
+    setup_logging()
+    try:
+        serve()
+    except KeyboardInterrupt:
+        pass
@@ -1,10 +1,48 @@
+import logging
 import os
+import tempfile
+import threading
 from pathlib import Path
 
-import whisper
+from app.config import WHISPER_MODEL_NAME
+from app.utils.log import log_payload
 
-# Load model hanya sekali
-model = whisper.load_model("base")  # atau "small", "medium", "large"
+logger = logging.getLogger(__name__)
+
+# Model dimuat sekali saat pertama dipakai (lazy), bukan saat import
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """
+    Return the Whisper model, loading it on first use.
+
+    The load is guarded by a lock so concurrent first requests only load the
+    weights once.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import whisper
+
+                _model = whisper.load_model(WHISPER_MODEL_NAME)
+    return _model
+
+
+def transcribe_bytes(audio: bytes, suffix: str) -> str:
+    """Transcribe raw audio bytes through a temporary file with ``suffix`` (ffmpeg needs a path)."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        tmp.write(audio)
+        tmp_path = tmp.name
+    try:
+        return transcribe_audio(tmp_path)
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except OSError as e:
+            logger.warning(f"Failed to cleanup temporary file: {str(e)}")
 
 
 def transcribe_audio(file_path: str) -> str:
@@ -32,7 +70,7 @@ def transcribe_audio(file_path: str) -> str:
         if file_size == 0:
             raise ValueError("Audio file is empty")
 
-        print(f"Transcribing audio: {file_path} ({file_size} bytes)")
+        logger.info(f"Transcribing audio: {file_path} ({file_size} bytes)")
 
         # Configure transcription options
         options = {
@@ -53,21 +91,21 @@ def transcribe_audio(file_path: str) -> str:
         }
 
         # Transcribe the audio
-        result = model.transcribe(file_path, **options)
+        result = get_model().transcribe(file_path, **options)
 
         # Extract text
         text = result["text"].strip()
 
         # Log additional info
         if "language" in result:
-            print(f"Detected language: {result['language']}")
+            logger.debug(f"Detected language: {result['language']}")
 
         if not text:
             raise ValueError("No text could be transcribed from the audio")
 
-        print(f"Transcription successful: {text[:100]}...")
+        log_payload(logger, "Transcription successful", text)
         return text
 
     except Exception as e:
-        print(f"Transcription error: {str(e)}")
+        logger.error(f"Transcription error: {str(e)}")
         raise Exception(f"Failed to transcribe audio: {str(e)}")
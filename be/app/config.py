@@ -9,3 +9,140 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Deployment role: matikan route OCR/voice di pod yang hanya melayani API
+ENABLE_OCR = os.getenv("ENABLE_OCR", "true").lower() == "true"
+ENABLE_VOICE = os.getenv("ENABLE_VOICE", "true").lower() == "true"
+
+# Model AI dimuat saat pertama dipakai; set WARMUP_MODELS=true untuk memuat saat startup
+WARMUP_MODELS = os.getenv("WARMUP_MODELS", "false").lower() == "true"
+WHISPER_MODEL_NAME = os.getenv("WHISPER_MODEL_NAME", "base")
+
+# Mode inference bersama: jika diisi (host:port atau path unix socket), worker API
+# mengirim pekerjaan OCR/transkripsi ke satu proses model_server alih-alih memuat model sendiri
+INFERENCE_SERVER_ADDRESS = os.getenv("INFERENCE_SERVER_ADDRESS", "")
+# Wajib diisi bila INFERENCE_SERVER_ADDRESS diatur: koneksi memakai pickle, jadi siapa pun
+# yang tahu kuncinya bisa menjalankan kode di server; tanpa kunci server maupun klien menolak jalan
+INFERENCE_SERVER_AUTHKEY = os.getenv("INFERENCE_SERVER_AUTHKEY", "")
+# Worker tetap di model_server; tiap model tetap hanya menjalankan satu inference sekaligus,
+# jadi 2 worker cukup untuk OCR dan transkripsi berjalan bersamaan
+INFERENCE_SERVER_WORKERS = int(os.getenv("INFERENCE_SERVER_WORKERS", "2"))
+INFERENCE_SERVER_QUEUE = int(os.getenv("INFERENCE_SERVER_QUEUE", "32"))
+
+# Batas antrean inference OCR agar burst scan struk tidak memblokir API
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "1"))
+OCR_MAX_QUEUE = int(os.getenv("OCR_MAX_QUEUE", "4"))
+OCR_TIMEOUT_SECONDS = float(os.getenv("OCR_TIMEOUT_SECONDS", "120"))
+
+# Batas antrean transkripsi Whisper, sama seperti OCR
+VOICE_MAX_WORKERS = int(os.getenv("VOICE_MAX_WORKERS", "1"))
+VOICE_MAX_QUEUE = int(os.getenv("VOICE_MAX_QUEUE", "4"))
+VOICE_TIMEOUT_SECONDS = float(os.getenv("VOICE_TIMEOUT_SECONDS", "120"))
+
+# Job OCR asinkron (antrean lokal in-process). Status job disimpan di memori proses, jadi
+# dengan beberapa worker uvicorn polling ke worker lain berbalas 404 kecuali OCR_JOB_REDIS_URL
+# diatur (butuh paket redis). Job yang sedang antre tetap hilang bila prosesnya mati.
+OCR_JOB_WORKERS = int(os.getenv("OCR_JOB_WORKERS", "1"))
+OCR_JOB_QUEUE_SIZE = int(os.getenv("OCR_JOB_QUEUE_SIZE", "32"))
+OCR_JOB_TTL_SECONDS = float(os.getenv("OCR_JOB_TTL_SECONDS", "3600"))
+OCR_JOB_REDIS_URL = os.getenv("OCR_JOB_REDIS_URL", "")
+
+# Webhook callback_url: body ditandatangani HMAC-SHA256 dengan WEBHOOK_SECRET (tanpa secret,
+# callback_url ditolak). Tanpa allowlist, hanya host yang resolve ke alamat publik diterima.
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_ALLOWED_HOSTS = {
+    host.strip().lower()
+    for host in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",")
+    if host.strip()
+}
+
+# Ukuran maksimal satu gambar struk; body request yang lebih besar ditolak 413 dari
+# Content-Length sebelum dibaca (app/utils/upload_limit.py)
+OCR_MAX_UPLOAD_BYTES = int(os.getenv("OCR_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+# Jumlah maksimal struk per request /ocr/scan-struk/batch
+OCR_BATCH_MAX_FILES = int(os.getenv("OCR_BATCH_MAX_FILES", "10"))
+
+# Backend inference Donut: "none" (fp32 PyTorch), "int8" (kuantisasi dinamis decoder,
+# khusus CPU) atau "onnx" (ONNX Runtime, butuh optimum[onnxruntime])
+DONUT_OPTIMIZATION = os.getenv("DONUT_OPTIMIZATION", "none").lower()
+# Hasil export ONNX disimpan di sini sekali, start berikutnya langsung memuatnya
+DONUT_ONNX_DIR = os.getenv(
+    "DONUT_ONNX_DIR", os.path.expanduser("~/.cache/finmate/donut-onnx")
+)
+
+# Batas token output Donut per struk (jauh di bawah max_position_embeddings decoder)
+DONUT_MAX_NEW_TOKENS = int(os.getenv("DONUT_MAX_NEW_TOKENS", "512"))
+
+# Praproses foto struk sebelum OCR (orientasi EXIF, downscale, crop, deskew)
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "true").lower() == "true"
+OCR_CROP = os.getenv("OCR_CROP", "true").lower() == "true"
+OCR_DESKEW = os.getenv("OCR_DESKEW", "true").lower() == "true"
+
+# Cache hasil OCR per hash gambar (LRU di memori, opsional disimpan ke disk)
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "256"))
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "")
+# File cache di OCR_CACHE_DIR kedaluwarsa setelah tidak dipakai selama TTL dan jumlahnya dibatasi
+OCR_CACHE_DISK_MAX_ENTRIES = int(os.getenv("OCR_CACHE_DISK_MAX_ENTRIES", "10000"))
+OCR_CACHE_DISK_TTL_SECONDS = float(
+    os.getenv("OCR_CACHE_DISK_TTL_SECONDS", str(30 * 24 * 3600))
+)
+
+# File JSON tambahan untuk memperluas kamus kategori struk (app/data/categories.json)
+CATEGORY_DICTIONARY_PATH = os.getenv("CATEGORY_DICTIONARY_PATH", "")
+
+# Model kategori lokal per user (naive Bayes atas n-gram ter-hash dari riwayat transaksi)
+CATEGORY_MODEL_MAX_USERS = int(os.getenv("CATEGORY_MODEL_MAX_USERS", "1000"))
+CATEGORY_MODEL_HISTORY = int(os.getenv("CATEGORY_MODEL_HISTORY", "200"))
+CATEGORY_MODEL_MIN_CONFIDENCE = float(os.getenv("CATEGORY_MODEL_MIN_CONFIDENCE", "0.6"))
+
+# Hashing password bcrypt: cost factor dan thread pool terpisah dari event loop.
+# Hash lama dengan cost berbeda di-hash ulang otomatis saat login berhasil.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+PASSWORD_HASH_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_HASH_TIMEOUT_SECONDS", "10"))
+
+# Rate limit login (token bucket): semua percobaan per IP, percobaan gagal per email.
+# RATE_LIMIT_REDIS_URL membuat bucket dibagi antar proses (butuh paket redis).
+LOGIN_IP_LIMIT = int(os.getenv("LOGIN_IP_LIMIT", "20"))
+LOGIN_IP_PERIOD_SECONDS = float(os.getenv("LOGIN_IP_PERIOD_SECONDS", "60"))
+LOGIN_EMAIL_FAILURES = int(os.getenv("LOGIN_EMAIL_FAILURES", "5"))
+LOGIN_EMAIL_PERIOD_SECONDS = float(os.getenv("LOGIN_EMAIL_PERIOD_SECONDS", "300"))
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+# Di belakang reverse proxy/ingress, request.client adalah alamat proxy: semua user berbagi
+# satu bucket IP. Isi TRUSTED_PROXY_IPS (daftar IP proxy dipisah koma, atau "*") agar IP
+# klien dibaca dari TRUSTED_PROXY_HEADER (entri terakhir X-Forwarded-For = yang ditambahkan
+# proxy kita). Alternatif: jalankan uvicorn dengan --proxy-headers --forwarded-allow-ips.
+TRUSTED_PROXY_IPS = {
+    ip.strip() for ip in os.getenv("TRUSTED_PROXY_IPS", "").split(",") if ip.strip()
+}
+TRUSTED_PROXY_HEADER = os.getenv("TRUSTED_PROXY_HEADER", "x-forwarded-for").lower()
+
+# Masa berlaku token: access token (berisi klaim profil user) dan refresh token.
+# Default access token tetap 24 jam karena finmate-fe belum memakai /auth/refresh; turunkan
+# (mis. 15) setelah klien menyimpan refresh_token dan memperbarui token saat 401.
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+# Koneksi Supabase: timeout per percobaan, batas waktu total per panggilan,
+# retry (khusus baca) dengan exponential backoff + jitter, dan circuit breaker
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))
+SUPABASE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_CONNECT_TIMEOUT_SECONDS", "3"))
+SUPABASE_DEADLINE_SECONDS = float(os.getenv("SUPABASE_DEADLINE_SECONDS", "20"))
+SUPABASE_MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", "2"))
+SUPABASE_RETRY_BACKOFF_SECONDS = float(os.getenv("SUPABASE_RETRY_BACKOFF_SECONDS", "0.2"))
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "100"))
+SUPABASE_BREAKER_THRESHOLD = int(os.getenv("SUPABASE_BREAKER_THRESHOLD", "5"))
+SUPABASE_BREAKER_RESET_SECONDS = float(os.getenv("SUPABASE_BREAKER_RESET_SECONDS", "30"))
+
+# Logging: level, format ("json" atau "text"), dan sampling payload besar
+# (hasil OCR, balasan Gemini, transkripsi) yang dicatat di level INFO
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+
+# /metrics ada di port API publik: scraper wajib mengirim "Authorization: Bearer <token>".
+# Tanpa token endpoint dimatikan (404).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
@@ -1,13 +1,34 @@
 # app/services/supabase_service.py
 
+import asyncio
 import datetime
-import json
-import uuid
+import functools
+import logging
+import random
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
 import httpx
-from app.config import SUPABASE_KEY, SUPABASE_URL
+import orjson
+from app.config import (
+    SUPABASE_BREAKER_RESET_SECONDS,
+    SUPABASE_BREAKER_THRESHOLD,
+    SUPABASE_CONNECT_TIMEOUT_SECONDS,
+    SUPABASE_DEADLINE_SECONDS,
+    SUPABASE_KEY,
+    SUPABASE_MAX_CONNECTIONS,
+    SUPABASE_MAX_RETRIES,
+    SUPABASE_RETRY_BACKOFF_SECONDS,
+    SUPABASE_TIMEOUT_SECONDS,
+    SUPABASE_URL,
+)
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.metrics import span
 from fastapi import HTTPException
 
+logger = logging.getLogger(__name__)
+
 # Headers global
 headers = {
     "apikey": SUPABASE_KEY,
@@ -16,49 +37,344 @@ headers = {
 }
 
 
-# Encoder untuk UUID dan tanggal
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, uuid.UUID):
-            return str(obj)
-        if isinstance(obj, (datetime.date, datetime.datetime)):
-            return obj.isoformat()
-        return super().default(obj)
+# Codec JSON untuk payload Supabase: orjson menangani UUID dan tanggal secara native
+def dumps(data: Any) -> bytes:
+    return orjson.dumps(data)
+
+
+def loads(content: Union[bytes, str]) -> Any:
+    return orjson.loads(content)
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _quote_value(value: Any) -> str:
+    """Quote a value for PostgREST list syntax, e.g. in.("a","b")."""
+    value = _format_value(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{value}"'
+
+
+@dataclass(frozen=True)
+class Query:
+    """
+    Immutable PostgREST query.
+
+    Every builder method returns a new Query, so a base query can be shared
+    and extended per request::
+
+        Query("transactions").select("id,amount").eq("user_id", user_id).order(
+            "transaction_date", desc=True
+        ).limit(20)
+
+    Values are sent as query params and URL-encoded by httpx, never pasted
+    into the URL, so a value containing "&" or "," cannot add filters.
+    """
+
+    table: str
+    columns: str = "*"
+    filters: Tuple[Tuple[str, str], ...] = ()
+    orders: Tuple[str, ...] = ()
+    row_limit: Optional[int] = None
+    row_offset: Optional[int] = None
+
+    def select(self, *columns: str) -> "Query":
+        return replace(self, columns=",".join(columns) or "*")
+
+    def _filter(self, column: str, expression: str) -> "Query":
+        return replace(self, filters=self.filters + ((column, expression),))
+
+    def eq(self, column: str, value: Any) -> "Query":
+        if value is None:
+            return self._filter(column, "is.null")
+        return self._filter(column, f"eq.{_format_value(value)}")
+
+    def gte(self, column: str, value: Any) -> "Query":
+        return self._filter(column, f"gte.{_format_value(value)}")
+
+    def lte(self, column: str, value: Any) -> "Query":
+        return self._filter(column, f"lte.{_format_value(value)}")
+
+    def in_(self, column: str, values: Iterable[Any]) -> "Query":
+        return self._filter(column, f"in.({','.join(map(_quote_value, values))})")
+
+    def ilike(self, column: str, pattern: str) -> "Query":
+        """Case-insensitive match; ``*`` is the wildcard."""
+        return self._filter(column, f"ilike.{pattern}")
+
+    def order(self, column: str, desc: bool = False) -> "Query":
+        return replace(
+            self, orders=self.orders + (f"{column}.{'desc' if desc else 'asc'}",)
+        )
+
+    def limit(self, count: int) -> "Query":
+        return replace(self, row_limit=count)
+
+    def range(self, start: int, end: int) -> "Query":
+        """Rows ``start`` to ``end`` inclusive (zero-based), for pagination."""
+        return replace(self, row_offset=start, row_limit=end - start + 1)
+
+    @functools.cached_property
+    def params(self) -> Tuple[Tuple[str, str], ...]:
+        """Query params for httpx, computed once per Query."""
+        params = [("select", self.columns), *self.filters]
+        if self.orders:
+            params.append(("order", ",".join(self.orders)))
+        if self.row_limit is not None:
+            params.append(("limit", str(self.row_limit)))
+        if self.row_offset is not None:
+            params.append(("offset", str(self.row_offset)))
+        return tuple(params)
+
+    @property
+    def url(self) -> str:
+        return f"{SUPABASE_URL}/rest/v1/{self.table}"
+
+
+class SupabaseError(HTTPException):
+    """
+    Structured error for a failed Supabase call.
+
+    ``detail`` is ``{"error", "message"}`` plus the upstream status and body
+    when Supabase answered. FastAPI returns it like any HTTPException.
+    """
+
+    def __init__(
+        self,
+        status_code: int,
+        error: str,
+        message: str,
+        upstream_status: Optional[int] = None,
+        details: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        detail = {"error": error, "message": message}
+        if upstream_status is not None:
+            detail["upstream_status"] = upstream_status
+        if details is not None:
+            detail["details"] = details
+        super().__init__(status_code=status_code, detail=detail, headers=headers)
+        self.error = error
+        self.upstream_status = upstream_status
+
+
+class SupabaseUnavailable(SupabaseError):
+    def __init__(self, message: str, retry_after: float = 5):
+        super().__init__(
+            503,
+            "supabase_unavailable",
+            message,
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+        )
+
+
+class SupabaseTimeout(SupabaseError):
+    def __init__(self, message: str = "Supabase tidak merespons tepat waktu"):
+        super().__init__(504, "supabase_timeout", message)
+
+
+# Status upstream yang dianggap sementara (boleh di-retry untuk request baca)
+RETRY_STATUSES = {500, 502, 503, 504}
+
+supabase_breaker = CircuitBreaker(
+    "supabase", SUPABASE_BREAKER_THRESHOLD, SUPABASE_BREAKER_RESET_SECONDS
+)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Shared client so connections to Supabase are pooled and reused."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                SUPABASE_TIMEOUT_SECONDS, connect=SUPABASE_CONNECT_TIMEOUT_SECONDS
+            ),
+            limits=httpx.Limits(max_connections=SUPABASE_MAX_CONNECTIONS),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _request(
+    method: str, url: str, idempotent: bool = False, **kwargs
+) -> httpx.Response:
+    """
+    Send a request to Supabase within ``SUPABASE_DEADLINE_SECONDS``.
+
+    Idempotent requests are retried on connection errors, timeouts and
+    transient 5xx with exponential backoff and full jitter. Writes are sent
+    once. Returns the last response (possibly an error status); raises
+    SupabaseUnavailable/SupabaseTimeout when no response was received or
+    the circuit breaker is open.
+    """
+    deadline = time.monotonic() + SUPABASE_DEADLINE_SECONDS
+    attempts = SUPABASE_MAX_RETRIES + 1 if idempotent else 1
+    response = None
+    error = None
+
+    for attempt in range(attempts):
+        try:
+            supabase_breaker.before_call()
+        except CircuitOpenError as e:
+            raise SupabaseUnavailable(
+                "Supabase sedang bermasalah, silakan coba lagi", e.retry_after
+            )
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        timeout = httpx.Timeout(
+            min(SUPABASE_TIMEOUT_SECONDS, remaining),
+            connect=min(SUPABASE_CONNECT_TIMEOUT_SECONDS, remaining),
+        )
+        try:
+            response = await get_client().request(method, url, timeout=timeout, **kwargs)
+            error = None
+        except httpx.TransportError as e:
+            response, error = None, e
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                # 4xx berarti Supabase sehat, hanya request-nya yang salah
+                supabase_breaker.record_success()
+                return response
+
+        supabase_breaker.record_failure()
+        if attempt == attempts - 1:
+            break
+        backoff = random.uniform(0, SUPABASE_RETRY_BACKOFF_SECONDS * 2**attempt)
+        if time.monotonic() + backoff >= deadline:
+            break
+        logger.warning(
+            f"Supabase {method} {url} failed "
+            f"({error!r} / {response.status_code if response is not None else None}), "
+            f"retry {attempt + 1} in {backoff:.2f}s"
+        )
+        await asyncio.sleep(backoff)
+
+    if response is not None:
+        return response
+    if error is None or isinstance(error, httpx.TimeoutException):
+        raise SupabaseTimeout()
+    raise SupabaseUnavailable(f"Gagal terhubung ke Supabase: {error.__class__.__name__}")
+
+
+def _raise_for_status(res: httpx.Response):
+    if res.status_code < 400:
+        return
+    try:
+        details = loads(res.content)
+    except ValueError:
+        details = res.text
+    # Error server di Supabase dilaporkan sebagai 502 (gateway), error request diteruskan
+    status_code = 502 if res.status_code >= 500 else res.status_code
+    raise SupabaseError(
+        status_code,
+        "supabase_error",
+        "Permintaan ke Supabase gagal",
+        upstream_status=res.status_code,
+        details=details,
+    )
+
+
+def _json(res: httpx.Response) -> Any:
+    try:
+        return loads(res.content)
+    except ValueError:
+        raise SupabaseError(
+            502,
+            "supabase_invalid_response",
+            "Respons Supabase bukan JSON yang valid",
+            upstream_status=res.status_code,
+        )
+
+
+# GET yang sedang berjalan per (url, params), untuk single-flight
+_inflight: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], "asyncio.Task"] = {}
+
+
+def _forget_inflight(key, task: "asyncio.Task"):
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    # Tandai exception sudah diambil walau semua pemanggil sudah batal
+    if not task.cancelled():
+        task.exception()
+
+
+async def _get_shared(url: str, params: Tuple[Tuple[str, str], ...]) -> httpx.Response:
+    """
+    GET with single-flight: identical GETs issued while one is in flight wait
+    for that request instead of sending their own.
+
+    The upstream request runs as its own task, so a caller that disconnects
+    does not cancel it for the others. Callers share the raw response and
+    each decodes its own copy of the body.
+    """
+    key = (url, params)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(
+            _request("GET", url, idempotent=True, params=params, headers=headers)
+        )
+        _inflight[key] = task
+        task.add_done_callback(functools.partial(_forget_inflight, key))
+    return await asyncio.shield(task)
 
 
 # Fetch data
-async def fetch_data(table: str, filters: str = "", order_by: str = ""):
-    async with httpx.AsyncClient() as client:
-        url = f"{SUPABASE_URL}/rest/v1/{table}?select=*" + filters
-        if order_by:
-            url += f"&order={order_by}"
-        res = await client.get(url, headers=headers)
-        return res.json()
+async def fetch_data(query: Query):
+    with span("supabase", f"select {query.table}"):
+        res = await _get_shared(query.url, query.params)
+        _raise_for_status(res)
+    return _json(res)
 
 
-# Insert data
-async def insert_data(table: str, data: dict):
+# Hitung jumlah baris yang cocok dengan query (tanpa mengambil isinya)
+async def count_data(query: Query) -> int:
+    headers_with_prefer = headers.copy()
+    headers_with_prefer["Prefer"] = "count=exact"
+
+    # Filter saja yang relevan; limit/offset/order diabaikan untuk hitungan total
+    params = [("select", query.columns), *query.filters]
+    with span("supabase", f"count {query.table}"):
+        res = await _request(
+            "HEAD", query.url, idempotent=True, params=params, headers=headers_with_prefer
+        )
+        _raise_for_status(res)
+    # Content-Range: "0-24/3573" atau "*/0"
+    total = res.headers.get("content-range", "*/0").rsplit("/", 1)[-1]
+    return int(total) if total.isdigit() else 0
+
+
+# Insert data (satu baris, atau list baris sekaligus dalam satu request)
+async def insert_data(table: str, data: Union[dict, List[dict]]):
     headers_with_prefer = headers.copy()
     headers_with_prefer["Prefer"] = "return=representation"
 
-    async with httpx.AsyncClient() as client:
-        res = await client.post(
+    with span("supabase", f"insert {table}"):
+        res = await _request(
+            "POST",
             f"{SUPABASE_URL}/rest/v1/{table}",
             headers=headers_with_prefer,
-            content=json.dumps(data, cls=CustomJSONEncoder),
+            content=dumps(data),
         )
-        
-        # Proper error handling based on status code
-        if res.status_code >= 400:
-            try:
-                detail = res.json()
-            except json.JSONDecodeError:
-                detail = res.text
-            raise HTTPException(status_code=res.status_code, detail=detail)
+        _raise_for_status(res)
 
-        if res.text:
-            return res.json()
-        return {"message": "Insert successful", "status": res.status_code}
+    if res.text:
+        return _json(res)
+    return {"message": "Insert successful", "status": res.status_code}
 
 
 # Update data
@@ -66,30 +382,35 @@ async def update_data(table: str, id: str, data: dict):
     headers_with_prefer = headers.copy()
     headers_with_prefer["Prefer"] = "return=representation"
 
-    async with httpx.AsyncClient() as client:
-        url = f"{SUPABASE_URL}/rest/v1/{table}?id=eq.{id}"
-        res = await client.patch(
-            url,
+    with span("supabase", f"update {table}"):
+        res = await _request(
+            "PATCH",
+            f"{SUPABASE_URL}/rest/v1/{table}",
+            params={"id": f"eq.{id}"},
             headers=headers_with_prefer,
-            content=json.dumps(data, cls=CustomJSONEncoder),
+            content=dumps(data),
         )
-        if res.text:
-            return res.json()
-        return {"message": "Update successful", "status": res.status_code}
+    if res.text:
+        return _json(res)
+    return {"message": "Update successful", "status": res.status_code}
 
 
 # Delete data
 async def delete_data(table: str, id: str):
-    async with httpx.AsyncClient() as client:
-        url = f"{SUPABASE_URL}/rest/v1/{table}?id=eq.{id}"
-        res = await client.delete(url, headers=headers)
-        if res.status_code == 204:
-            return {"ok": True, "message": "Transaksi berhasil dihapus"}
-        try:
-            return res.json()
-        except:
-            return {
-                "ok": False,
-                "message": "Gagal menghapus",
-                "status": res.status_code,
-            }
+    with span("supabase", f"delete {table}"):
+        res = await _request(
+            "DELETE",
+            f"{SUPABASE_URL}/rest/v1/{table}",
+            params={"id": f"eq.{id}"},
+            headers=headers,
+        )
+    if res.status_code == 204:
+        return {"ok": True, "message": "Transaksi berhasil dihapus"}
+    try:
+        return loads(res.content)
+    except ValueError:
+        return {
+            "ok": False,
+            "message": "Gagal menghapus",
+            "status": res.status_code,
+        }
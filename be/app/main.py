@@ -1,8 +1,51 @@
 # app/main.py
-from app.routes import auth, chat, ocr, profile, transactions, user, voice
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import Optional
 
-app = FastAPI()
+from app.config import (
+    ENABLE_OCR,
+    ENABLE_VOICE,
+    INFERENCE_SERVER_ADDRESS,
+    INFERENCE_SERVER_AUTHKEY,
+    WARMUP_MODELS,
+)
+from app.database import close_client
+from app.routes import auth, chat, profile, transactions, user
+from app.utils.log import setup_logging
+from app.utils.metrics import metrics_response
+from app.utils.middleware import RequestMiddleware
+from fastapi import FastAPI, Header
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Di sini, bukan saat import: mengimpor app (tes, tools) tidak mengubah logging
+    # root, dan logger uvicorn yang dikonfigurasi saat start sudah ada untuk dialihkan
+    setup_logging()
+    if INFERENCE_SERVER_ADDRESS and not INFERENCE_SERVER_AUTHKEY:
+        raise RuntimeError(
+            "INFERENCE_SERVER_AUTHKEY wajib diatur bila INFERENCE_SERVER_ADDRESS dipakai"
+        )
+    # Warm-up opsional supaya request pertama tidak menunggu model dimuat.
+    # Di mode inference bersama, model hanya ada di proses model_server.
+    if WARMUP_MODELS and not INFERENCE_SERVER_ADDRESS:
+        if ENABLE_OCR:
+            from app.ai_models import donut_loader
+
+            await run_in_threadpool(donut_loader.load_model)
+        if ENABLE_VOICE:
+            from app.ai_models import whisper_model
+
+            await run_in_threadpool(whisper_model.get_model)
+    yield
+    await close_client()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+# Satu middleware ASGI: request id, timing/metrics, dan batas ukuran upload
+app.add_middleware(RequestMiddleware)
 
 # Include routes
 app.include_router(transactions.router, prefix="/transactions", tags=["Transactions"])
@@ -10,10 +53,24 @@ app.include_router(user.router, prefix="/users", tags=["User"])
 app.include_router(profile.router, prefix="/profile", tags=["Profile"])
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(chat.router, prefix="/chat", tags=["AI Konsultan"])
-app.include_router(ocr.router, prefix="/ocr", tags=["OCR"])
-app.include_router(voice.router, prefix="/voice", tags=["Voice Input"])
+
+# Route OCR/voice hanya dimuat jika diaktifkan untuk deployment ini
+if ENABLE_OCR:
+    from app.routes import ocr
+
+    app.include_router(ocr.router, prefix="/ocr", tags=["OCR"])
+if ENABLE_VOICE:
+    from app.routes import voice
+
+    app.include_router(voice.router, prefix="/voice", tags=["Voice Input"])
 
 
 @app.get("/")
 def root():
     return {"message": "FinMate Backend Aktif"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(authorization: Optional[str] = Header(None)):
+    # Port API publik: hanya scraper yang memegang METRICS_TOKEN
+    return metrics_response(authorization)
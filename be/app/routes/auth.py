@@ -1,23 +1,55 @@
 # app/routes/auth.py
-from app.database import fetch_data, insert_data
-from app.schemas import UserLogin, UserOut, UserRegister
-from app.utils.auth import create_access_token
-from fastapi import APIRouter, HTTPException
-from passlib.context import CryptContext
+import logging
 
+from app.config import (
+    LOGIN_EMAIL_FAILURES,
+    LOGIN_EMAIL_PERIOD_SECONDS,
+    LOGIN_IP_LIMIT,
+    LOGIN_IP_PERIOD_SECONDS,
+    RATE_LIMIT_REDIS_URL,
+)
+from app.database import Query, fetch_data, insert_data, update_data
+from app.schemas import RefreshRequest, TokenResponse, UserLogin, UserOut, UserRegister
+from app.utils.auth import (
+    USER_COLUMNS,
+    create_token_pair,
+    decode_token,
+    fetch_user,
+    hash_password,
+    verify_password,
+)
+from app.utils.rate_limit import (
+    TokenBucketLimiter,
+    client_ip,
+    create_backend,
+    raise_rate_limited,
+)
+from fastapi import APIRouter, HTTPException, Request
+
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Semua percobaan login dibatasi per IP dan per email; login berhasil mengosongkan
+# hitungan email sehingga yang tersisa praktis hanya percobaan gagal
+rate_limit_backend = create_backend(RATE_LIMIT_REDIS_URL or None)
+login_ip_limiter = TokenBucketLimiter(
+    "login-ip", LOGIN_IP_LIMIT, LOGIN_IP_PERIOD_SECONDS, rate_limit_backend
+)
+login_failure_limiter = TokenBucketLimiter(
+    "login-email", LOGIN_EMAIL_FAILURES, LOGIN_EMAIL_PERIOD_SECONDS, rate_limit_backend
+)
 
 
 @router.post("/register", response_model=UserOut)
 async def register(user: UserRegister):
     # Cek email sudah ada
-    existing = await fetch_data("users", f"&email=eq.{user.email}")
+    existing = await fetch_data(
+        Query("users").select("id").eq("email", user.email).limit(1)
+    )
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await hash_password(user.password)
     data = {
         "name": user.name,
         "email": user.email,
@@ -29,18 +61,57 @@ async def register(user: UserRegister):
     return inserted[0]
 
 
-@router.post("/login")
-async def login(credentials: UserLogin):
-    users = await fetch_data("users", f"&email=eq.{credentials.email}")
+@router.post("/login", response_model=TokenResponse)
+async def login(credentials: UserLogin, request: Request):
+    # Ditolak sebelum query Supabase dan bcrypt. Token email diambil di sini, bukan
+    # setelah verifikasi, agar percobaan paralel tidak lolos pengecekan bersamaan
+    ip = client_ip(request)
+    email = credentials.email.lower()
+    retry_after = await login_ip_limiter.hit(ip)
+    if not retry_after:
+        retry_after = await login_failure_limiter.hit(email)
+    if retry_after:
+        logger.warning(f"Login rate limited for {ip} / {email}")
+        raise_rate_limited(retry_after)
+
+    users = await fetch_data(
+        Query("users")
+        .select(USER_COLUMNS, "password_hash")
+        .eq("email", credentials.email)
+        .limit(1)
+    )
     if not users:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     user = users[0]
-    if not pwd_context.verify(credentials.password, user["password_hash"]):
+    valid, new_hash = await verify_password(
+        credentials.password, user["password_hash"]
+    )
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    token = create_access_token(
-        {"sub": user["id"], "email": user["email"], "role": user["role"]}
-    )
+    # Login berhasil: token yang diambil di awal dikembalikan
+    await login_failure_limiter.reset(email)
+
+    # Cost bcrypt berubah sejak hash ini dibuat: simpan hash baru
+    if new_hash:
+        try:
+            await update_data("users", user["id"], {"password_hash": new_hash})
+        except Exception as e:
+            logger.warning(f"Failed to rehash password for {user['id']}: {str(e)}")
+
+    return create_token_pair(user)
+
+
+@router.post("/refresh", response_model=TokenResponse)
+async def refresh(body: RefreshRequest):
+    payload = decode_token(body.refresh_token)
+    if payload.get("typ") != "refresh" or not payload.get("sub"):
+        raise HTTPException(status_code=401, detail="Token tidak valid")
 
-    return {"access_token": token, "token_type": "bearer"}
+    # Profil diambil ulang supaya klaim di access token baru selalu terkini
+    try:
+        user = await fetch_user(payload["sub"])
+    except HTTPException:
+        raise HTTPException(status_code=401, detail="Token tidak valid")
+    return create_token_pair(user)
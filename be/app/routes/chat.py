@@ -2,18 +2,20 @@ from typing import List
 from uuid import UUID
 
 from app.ai_models.gemini_client import ask_gemini_with_history
-from app.database import delete_data, fetch_data, insert_data
+from app.database import Query, delete_data, fetch_data, insert_data
 from app.schemas import ChatRequest, Message
-from app.utils.auth import get_current_user
+from app.utils.auth import get_current_user, get_verified_user
 from fastapi import APIRouter, Depends, HTTPException
 
 router = APIRouter()
 
 
 @router.post("/chatbot/session")
-async def get_or_create_session(user=Depends(get_current_user)):
+async def get_or_create_session(user=Depends(get_verified_user)):
     user_id = user["id"]
-    sessions = await fetch_data("chat_sessions", f"&user_id=eq.{user_id}")
+    sessions = await fetch_data(
+        Query("chat_sessions").select("id").eq("user_id", user_id).limit(1)
+    )
     if sessions:
         return {"session_id": sessions[0]["id"]}
 
@@ -24,19 +26,22 @@ async def get_or_create_session(user=Depends(get_current_user)):
 @router.get("/chatbot/history/{session_id}")
 async def get_chat_history(session_id: UUID, user=Depends(get_current_user)):
     messages = await fetch_data(
-        "chat_messages", f"&session_id=eq.{session_id}&order=created_at.asc"
+        Query("chat_messages").eq("session_id", session_id).order("created_at")
     )
     return {"history": messages}
 
 
 @router.post("/chatbot/message")
-async def send_message(req: ChatRequest, user=Depends(get_current_user)):
+async def send_message(req: ChatRequest, user=Depends(get_verified_user)):
     session_id = str(req.session_id)
     user_id = user["id"]  # Ambil user_id untuk konteks
 
     # Ambil history chat
     messages = await fetch_data(
-        "chat_messages", f"&session_id=eq.{session_id}&order=created_at.asc"
+        Query("chat_messages")
+        .select("role", "content")
+        .eq("session_id", session_id)
+        .order("created_at")
     )
     history = [{"role": m["role"], "parts": [m["content"]]} for m in messages]
 
@@ -58,11 +63,15 @@ async def send_message(req: ChatRequest, user=Depends(get_current_user)):
 
 
 @router.delete("/chatbot/session/{session_id}")
-async def delete_chat_session(session_id: UUID, user=Depends(get_current_user)):
+async def delete_chat_session(session_id: UUID, user=Depends(get_verified_user)):
     user_id = user["id"]  # Perbaiki dari user["user_id"] ke user["id"]
 
     session_data = await fetch_data(
-        "chat_sessions", f"&id=eq.{session_id}&user_id=eq.{user_id}"
+        Query("chat_sessions")
+        .select("id")
+        .eq("id", session_id)
+        .eq("user_id", user_id)
+        .limit(1)
     )
     if not session_data:
         raise HTTPException(
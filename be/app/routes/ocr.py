@@ -1,37 +1,64 @@
 # app/routes/ocr.py
+import asyncio
+import concurrent.futures
+import contextlib
 import json
 import logging
-import os
-import tempfile
 from datetime import date
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
-from app.ai_models.donut_loader import predict_from_image_path
+from app.ai_models.model_server import run_ocr, run_ocr_batch
+from app.config import (
+    OCR_BATCH_MAX_FILES,
+    OCR_CACHE_DIR,
+    OCR_CACHE_DISK_MAX_ENTRIES,
+    OCR_CACHE_DISK_TTL_SECONDS,
+    OCR_CACHE_SIZE,
+    OCR_JOB_QUEUE_SIZE,
+    OCR_JOB_REDIS_URL,
+    OCR_JOB_TTL_SECONDS,
+    OCR_JOB_WORKERS,
+    OCR_MAX_QUEUE,
+    OCR_MAX_UPLOAD_BYTES,
+    OCR_MAX_WORKERS,
+    OCR_TIMEOUT_SECONDS,
+)
 from app.database import insert_data
-from app.utils.auth import get_current_user
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
-from fastapi.responses import JSONResponse
+from app.utils.money import parse_amount
+from app.utils.auth import get_current_user, get_verified_user
+from app.utils.category_classifier import get_classifier
+from app.utils.category_model import category_models
+from app.utils.executor import BoundedExecutor
+from app.utils.jobs import JobQueue, create_job_store
+from app.utils.log import log_payload
+from app.utils.receipt_cache import ReceiptCache
+from app.utils.webhook import check_callback_url
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi.responses import ORJSONResponse
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Hasil OCR per hash gambar, untuk upload ulang struk yang sama
+receipt_cache = ReceiptCache(
+    OCR_CACHE_SIZE,
+    OCR_CACHE_DIR or None,
+    max_disk_entries=OCR_CACHE_DISK_MAX_ENTRIES,
+    disk_ttl=OCR_CACHE_DISK_TTL_SECONDS,
+)
 
-@router.post("/scan-struk")
-async def scan_struk(
-    file: UploadFile = File(...),
-    user: dict = Depends(get_current_user),
-):
-    """
-    Endpoint untuk scan struk menggunakan OCR
-    Args:
-        file: Image file (JPG/PNG)
-        user: Current authenticated user
-        db: Database connection
-    Returns:
-        JSON response with extracted data and saved transaction
-    """
+# Inference OCR dijalankan di luar event loop dengan antrean terbatas
+ocr_executor = BoundedExecutor(
+    "ocr", OCR_MAX_WORKERS, OCR_MAX_QUEUE, timeout=OCR_TIMEOUT_SECONDS
+)
+
+
+MAX_UPLOAD_BYTES = OCR_MAX_UPLOAD_BYTES
+MAX_UPLOAD_MB = MAX_UPLOAD_BYTES // (1024 * 1024)
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def validate_image_upload(file: UploadFile):
     # Validate file type
     if not file.content_type or file.content_type not in [
         "image/jpeg",
@@ -40,39 +67,159 @@ async def scan_struk(
     ]:
         raise HTTPException(status_code=400, detail="File harus berupa JPG/PNG")
 
-    # Validate file size (max 10MB)
-    if file.size and file.size > 10 * 1024 * 1024:
+    # Validate file size (max MAX_UPLOAD_BYTES)
+    if file.size and file.size > MAX_UPLOAD_BYTES:
         raise HTTPException(
-            status_code=400, detail="Ukuran file terlalu besar (maksimal 10MB)"
+            status_code=400, detail=f"Ukuran file terlalu besar (maksimal {MAX_UPLOAD_MB}MB)"
         )
 
-    temp_file_path = None
-    try:
-        # Read file contents
-        contents = await file.read()
-
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-            temp_file.write(contents)
-            temp_file_path = temp_file.name
-
-        logger.info(f"Processing image: {file.filename}, size: {len(contents)} bytes")
 
-        # Process image with OCR
-        ocr_result = predict_from_image_path(temp_file_path)
+async def read_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """
+    Read the upload in chunks, stopping as soon as it exceeds ``max_bytes``.
 
-        # Check if OCR failed
-        if "error" in ocr_result:
+    This bounds memory only: the body has already been received and spooled
+    by the time the route runs. The request-level limit is enforced earlier
+    by ``UploadLimitMiddleware``.
+    """
+    buffer = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
             raise HTTPException(
-                status_code=500, detail=f"Gagal memproses struk: {ocr_result['error']}"
+                status_code=413, detail=f"Ukuran file terlalu besar (maksimal {MAX_UPLOAD_MB}MB)"
             )
+    return bytes(buffer)
+
+
+async def run_ocr_on_bytes(contents: bytes, image_key: str) -> Dict:
+    """Run OCR on raw image bytes and raise HTTPException if it fails."""
+    # Upload ulang gambar yang sama tidak perlu inference lagi, dan upload
+    # bersamaan gambar yang sama menunggu satu inference yang sama.
+    # Gambar di-decode langsung dari memori, tanpa file sementara
+    ocr_result = await receipt_cache.get_or_compute(
+        image_key, lambda: ocr_executor.run(run_ocr, contents)
+    )
+
+    # Check if OCR failed
+    if "error" in ocr_result:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Gagal memproses struk: {ocr_result['error']}",
+        )
+
+    return ocr_result
+
+
+def _ocr_batch_and_cache(
+    loop: asyncio.AbstractEventLoop,
+    images: List[bytes],
+    keys: List[str],
+    timeout: float,
+) -> Tuple[List[Dict], List[concurrent.futures.Future]]:
+    """Run in the OCR thread: batch inference, then schedule caching of each result."""
+    results = run_ocr_batch(images, timeout=timeout)
+    # Dijadwalkan dari thread ini supaya hasil tetap di-cache walau request
+    # sudah dijawab 504; upload ulang batch yang sama tidak perlu inference lagi
+    stored = [
+        asyncio.run_coroutine_threadsafe(receipt_cache.put(key, result), loop)
+        for key, result in zip(keys, results)
+        if "error" not in result
+    ]
+    return results, stored
+
+
+async def run_ocr_on_batch(
+    contents_list: List[bytes], image_keys: List[str]
+) -> List[Dict]:
+    """Run OCR on several images in one batched inference pass."""
+    results = [await receipt_cache.get(key) for key in image_keys]
 
-        # Extract data with fallbacks
-        user_id = user["id"]
-        amount = float(ocr_result.get("total", 0))
-        category = ocr_result.get("category", "lainnya")
-        trans_date = ocr_result.get("date") or str(date.today())
-        note = ocr_result.get("note", "Hasil OCR struk")
+    # Hanya gambar yang belum pernah diproses yang masuk batch inference
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        # Batas waktu ikut jumlah gambar, bukan batas satu struk untuk seluruh batch
+        deadline = OCR_TIMEOUT_SECONDS * len(missing)
+        batch_results, stored = await ocr_executor.run(
+            _ocr_batch_and_cache,
+            asyncio.get_running_loop(),
+            [contents_list[i] for i in missing],
+            [image_keys[i] for i in missing],
+            deadline,
+            timeout=deadline,
+        )
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in stored))
+        for i, ocr_result in zip(missing, batch_results):
+            results[i] = ocr_result
+
+    return results
+
+
+def receipt_text(ocr_result: Dict) -> str:
+    """Store name and item names of a receipt, as input for the category model."""
+    store_name = (ocr_result.get("parsed_data") or {}).get("store_name") or ""
+    item_names = [item.get("name", "") for item in ocr_result.get("items", [])]
+    return " ".join([store_name, *item_names]).strip()
+
+
+async def save_ocr_transaction(
+    ocr_result: Dict,
+    user: dict,
+    image_key: Optional[str] = None,
+    force: bool = False,
+) -> Dict:
+    """
+    Save the OCR result as an expense transaction and build the response body.
+
+    If the same user already created a transaction from this image, nothing is
+    inserted and the response points at the existing transaction with
+    ``duplicate: true``, unless ``force`` is set.
+    """
+    # Extract data with fallbacks
+    user_id = user["id"]
+    amount = float(ocr_result.get("total", 0))
+    category = ocr_result.get("category", "lainnya")
+    trans_date = ocr_result.get("date") or str(date.today())
+    note = ocr_result.get("note", "Hasil OCR struk")
+
+    # Kamus kategori tidak mengenali toko/item: pakai tebakan dari riwayat user
+    # (berdasarkan nama toko dan item, bukan catatan yang berawalan tetap)
+    if category == get_classifier().default:
+        suggestion = await category_models.suggest(user_id, receipt_text(ocr_result))
+        if suggestion:
+            category = suggestion[0]
+
+    extracted = {
+        "total": amount,
+        "category": category,
+        "date": trans_date,
+        "note": note,
+        "items": ocr_result.get("items", []),
+        "raw_ocr": ocr_result.get("raw_ocr", ""),
+    }
+
+    # Upload bersamaan struk yang sama menunggu di sini, supaya yang kedua
+    # melihat transaksi yang pertama alih-alih membuat duplikat
+    guard = receipt_cache.lock(image_key) if image_key else contextlib.nullcontext()
+    async with guard:
+        duplicate_id = (
+            await receipt_cache.get_transaction(user_id, image_key)
+            if image_key and not force
+            else None
+        )
+        if duplicate_id:
+            logger.info(f"Duplicate receipt upload, existing transaction {duplicate_id}")
+            return {
+                "message": "Struk ini sudah pernah dipindai, transaksi tidak dibuat ulang",
+                "duplicate": True,
+                "extracted": extracted,
+                "transaction": {
+                    "id": duplicate_id,
+                    "amount": amount,
+                    "category": category,
+                    "date": trans_date,
+                },
+            }
 
         # Validate amount
         if amount <= 0:
@@ -94,7 +241,7 @@ async def scan_struk(
         # Save transaction to database
         try:
             save_result = await insert_data("transactions", transaction_data)
-            logger.info(f"Transaction saved successfully: {save_result}")
+            log_payload(logger, "Transaction saved successfully", save_result)
 
             # Extract the actual record from the list
             saved_transaction = (
@@ -106,50 +253,226 @@ async def scan_struk(
         except Exception as db_error:
             logger.error(f"Database error: {str(db_error)}")
             # Return OCR result even if database save fails
-            return JSONResponse(
-                status_code=200,
-                content={
-                    "message": "Struk berhasil diproses, tapi gagal menyimpan ke database",
-                    "extracted": ocr_result,
-                    "warning": "Data tidak tersimpan ke database",
-                    "db_error": str(db_error),
-                },
+            return {
+                "message": "Struk berhasil diproses, tapi gagal menyimpan ke database",
+                "extracted": ocr_result,
+                "warning": "Data tidak tersimpan ke database",
+                "db_error": str(db_error),
+            }
+
+        transaction_id = saved_transaction.get("id") if saved_transaction else None
+        if transaction_id:
+            await save_transaction_items(
+                extracted["items"], transaction_id, user_id, category, trans_date
+            )
+        if image_key and transaction_id:
+            await receipt_cache.remember_transaction(user_id, image_key, transaction_id)
+
+        return {
+            "message": "Transaksi berhasil dibuat dari struk",
+            "duplicate": False,
+            "extracted": extracted,
+            "transaction": {
+                "id": transaction_id,
+                "amount": amount,
+                "category": category,
+                "date": trans_date,
+            },
+        }
+
+
+def build_item_rows(
+    items: List[Dict], transaction_id: str, user_id: str, category: str, trans_date: str
+) -> List[Dict]:
+    """Turn OCR items into ``transaction_items`` rows linked to the transaction."""
+    rows = []
+    for item in items:
+        name = (item.get("name") or "").strip()
+        if not name:
+            continue
+        quantity = parse_amount(item.get("count"))
+        rows.append(
+            {
+                "transaction_id": transaction_id,
+                "user_id": user_id,
+                "name": name,
+                "quantity": int(quantity) if quantity and quantity > 0 else 1,
+                "unit_price": parse_amount(item.get("unit_price")),
+                "price": parse_amount(item.get("price")) or 0,
+                "category": category,
+                "transaction_date": trans_date,
+            }
+        )
+    return rows
+
+
+async def save_transaction_items(
+    items: List[Dict], transaction_id: str, user_id: str, category: str, trans_date: str
+):
+    """
+    Insert all receipt items in one request; failures do not undo the transaction.
+
+    Needs the ``transaction_items`` table from ``migrations/001_transaction_items.sql``.
+    """
+    rows = build_item_rows(items, transaction_id, user_id, category, trans_date)
+    if not rows:
+        return
+    try:
+        await insert_data("transaction_items", rows)
+    except Exception as e:
+        logger.warning(
+            f"Failed to save {len(rows)} items for transaction {transaction_id}: {str(e)}"
+        )
+
+
+async def process_receipt_job(payload: Dict, user: dict) -> Dict:
+    image_key = receipt_cache.key(payload["contents"])
+    ocr_result = await run_ocr_on_bytes(payload["contents"], image_key)
+    return await save_ocr_transaction(
+        ocr_result, user, image_key=image_key, force=payload["force"]
+    )
+
+
+# Antrean job lokal (in-process) untuk scan struk asinkron; status job dibagi
+# antar worker hanya bila OCR_JOB_REDIS_URL diatur
+ocr_jobs = JobQueue(
+    "ocr",
+    process_receipt_job,
+    workers=OCR_JOB_WORKERS,
+    max_queue=OCR_JOB_QUEUE_SIZE,
+    ttl=OCR_JOB_TTL_SECONDS,
+    store=create_job_store(OCR_JOB_TTL_SECONDS, OCR_JOB_REDIS_URL or None),
+)
+
+
+@router.post("/scan-struk")
+async def scan_struk(
+    file: UploadFile = File(...),
+    force: bool = False,
+    user: dict = Depends(get_verified_user),
+):
+    """
+    Endpoint untuk scan struk menggunakan OCR
+    Args:
+        file: Image file (JPG/PNG)
+        force: Tetap buat transaksi walaupun struk yang sama sudah pernah dipindai
+        user: Current authenticated user
+    Returns:
+        JSON response with extracted data and saved transaction
+    """
+    validate_image_upload(file)
+
+    try:
+        # Read file contents
+        contents = await read_upload(file)
+        logger.info(f"Processing image: {file.filename}, size: {len(contents)} bytes")
+
+        image_key = receipt_cache.key(contents)
+        ocr_result = await run_ocr_on_bytes(contents, image_key)
+        content = await save_ocr_transaction(
+            ocr_result, user, image_key=image_key, force=force
+        )
+        return ORJSONResponse(status_code=200, content=content)
+
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Gagal memproses struk: {str(e)}")
+
+
+@router.post("/scan-struk/batch")
+async def scan_struk_batch(
+    files: List[UploadFile] = File(...),
+    force: bool = False,
+    user: dict = Depends(get_verified_user),
+):
+    """
+    Scan beberapa struk sekaligus dalam satu proses inference.
+    Setiap struk yang berhasil dibaca disimpan sebagai transaksi terpisah.
+    """
+    if len(files) > OCR_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maksimal {OCR_BATCH_MAX_FILES} struk per permintaan",
+        )
+
+    for file in files:
+        validate_image_upload(file)
+
+    try:
+        contents_list = [await read_upload(file) for file in files]
+        logger.info(f"Processing batch of {len(files)} images")
+
+        image_keys = [receipt_cache.key(contents) for contents in contents_list]
+        ocr_results = await run_ocr_on_batch(contents_list, image_keys)
+
+        results = []
+        for file, image_key, ocr_result in zip(files, image_keys, ocr_results):
+            if "error" in ocr_result:
+                results.append(
+                    {
+                        "filename": file.filename,
+                        "error": f"Gagal memproses struk: {ocr_result['error']}",
+                    }
+                )
+                continue
+
+            content = await save_ocr_transaction(
+                ocr_result, user, image_key=image_key, force=force
             )
+            results.append({"filename": file.filename, **content})
 
-        # Return success response
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content={
-                "message": "Transaksi berhasil dibuat dari struk",
-                "extracted": {
-                    "total": amount,
-                    "category": category,
-                    "date": trans_date,
-                    "note": note,
-                    "items": ocr_result.get("items", []),
-                    "raw_ocr": ocr_result.get("raw_ocr", ""),
-                },
-                "transaction": {
-                    "id": saved_transaction.get("id") if saved_transaction else None,
-                    "amount": amount,
-                    "category": category,
-                    "date": trans_date,
-                },
+                "message": f"{len(files)} struk selesai diproses",
+                "results": results,
             },
         )
 
     except HTTPException:
-        # Re-raise HTTP exceptions
         raise
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Gagal memproses struk: {str(e)}")
 
-    finally:
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-                logger.info(f"Cleaned up temporary file: {temp_file_path}")
-            except Exception as cleanup_error:
-                logger.warning(f"Failed to cleanup temp file: {cleanup_error}")
+
+@router.post("/scan-struk/jobs", status_code=202)
+async def create_scan_job(
+    file: UploadFile = File(...),
+    callback_url: Optional[str] = Form(None),
+    force: bool = False,
+    user: dict = Depends(get_verified_user),
+):
+    """
+    Versi asinkron dari /scan-struk: langsung mengembalikan job_id.
+    Hasil bisa di-poll lewat /scan-struk/jobs/{job_id}, atau dikirim
+    (POST JSON bertanda tangan, lihat app/utils/webhook.py) ke callback_url
+    jika diberikan.
+    """
+    validate_image_upload(file)
+
+    if callback_url:
+        await check_callback_url(callback_url)
+
+    contents = await read_upload(file)
+    job = await ocr_jobs.submit(
+        {"contents": contents, "force": force}, user, callback_url=callback_url
+    )
+    logger.info(f"Queued OCR job {job.id}: {file.filename}, size: {len(contents)} bytes")
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/ocr/scan-struk/jobs/{job.id}",
+    }
+
+
+@router.get("/scan-struk/jobs/{job_id}")
+async def get_scan_job(job_id: str, user: dict = Depends(get_current_user)):
+    job = await ocr_jobs.get(job_id, user["id"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan")
+    return job.to_dict()
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from uuid import UUID
 from app import schemas
-from app.utils.auth import get_current_user
-from app.database import fetch_data, update_data
+from app.utils.auth import create_user_access_token, get_current_user, get_verified_user
+from app.database import Query, fetch_data, update_data
 
 router = APIRouter()
 
+
+def rotate_access_token(response: Response, user: dict):
+    # Klaim profil di access token lama sudah basi; klien mengganti token dari header ini
+    response.headers["X-Access-Token"] = create_user_access_token(user)
+
 @router.get("/", response_model=schemas.UserOut)
 async def get_profile(current_user: dict = Depends(get_current_user)):
     return current_user
@@ -14,7 +19,8 @@ async def get_profile(current_user: dict = Depends(get_current_user)):
 @router.put("/profile/update", response_model=schemas.UserOut)
 async def update_profile(
     updates: schemas.UserUpdate,
-    current_user: dict = Depends(get_current_user),
+    response: Response,
+    current_user: dict = Depends(get_verified_user),
 ):
     update_fields = {}
     if updates.name:
@@ -26,25 +32,30 @@ async def update_profile(
         raise HTTPException(status_code=400, detail="No updates provided")
 
     updated_user = await update_data("users", str(current_user["id"]), update_fields)
-    return updated_user[0] 
+    rotate_access_token(response, updated_user[0])
+    return updated_user[0]
 
 
 @router.post("/family/join", response_model=schemas.UserOut)
 async def join_family(
     family_id: UUID,
-    current_user: dict = Depends(get_current_user),
+    response: Response,
+    current_user: dict = Depends(get_verified_user),
 ):
-    families = await fetch_data("families", f"&id=eq.{family_id}")
+    families = await fetch_data(Query("families").select("id").eq("id", family_id).limit(1))
     if not families:
         raise HTTPException(status_code=404, detail="Family not found")
 
     updated_user = await update_data("users", str(current_user["id"]), {"family_id": str(family_id)})
+    rotate_access_token(response, updated_user[0])
     return updated_user[0]
 
 
 @router.post("/family/leave", response_model=schemas.UserOut)
 async def leave_family(
-    current_user: dict = Depends(get_current_user),
+    response: Response,
+    current_user: dict = Depends(get_verified_user),
 ):
     updated_user = await update_data("users", str(current_user["id"]), {"family_id": None})
+    rotate_access_token(response, updated_user[0])
     return updated_user[0]
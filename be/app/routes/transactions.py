@@ -1,17 +1,26 @@
 # app/routes/transactions.py
 from typing import Optional
 
-from app.database import delete_data, fetch_data, insert_data, update_data
+from app.database import (
+    Query,
+    count_data,
+    delete_data,
+    fetch_data,
+    insert_data,
+    update_data,
+)
 from app.schemas import TransactionCreate, TransactionUpdate
-from app.utils.auth import get_current_user
+from app.utils.auth import get_current_user, get_verified_user
+from app.utils.category_model import category_models
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi import Query as QueryParam
 
 router = APIRouter()
 
 
 # Membuat transaksi baru
 @router.post("/create")
-async def create_transaction(trans: TransactionCreate, user=Depends(get_current_user)):
+async def create_transaction(trans: TransactionCreate, user=Depends(get_verified_user)):
     user_id = user["id"]
     data = trans.dict()
     data["user_id"] = user_id
@@ -21,6 +30,10 @@ async def create_transaction(trans: TransactionCreate, user=Depends(get_current_
     if "code" in result:
         raise HTTPException(status_code=400, detail=result)
 
+    # Hanya kategori yang dipilih user sendiri yang dipelajari
+    if data.get("method") == "manual":
+        category_models.learn(user_id, data.get("note"), data.get("category"))
+
     return {"message": "Transaksi berhasil ditambahkan", "data": result}
 
 
@@ -31,31 +44,76 @@ async def get_transactions(
     category: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    limit: Optional[int] = QueryParam(None, ge=1, le=500),
+    offset: int = QueryParam(0, ge=0),
     user=Depends(get_current_user),
 ):
     user_id = user["id"]
-    filters = f"&user_id=eq.{user_id}"
+    query = Query("transactions").eq("user_id", user_id)
 
     if type:
-        filters += f"&type=eq.{type}"
+        query = query.eq("type", type)
     if category:
-        filters += f"&category=eq.{category}"
+        query = query.eq("category", category)
     if start_date:
-        filters += f"&transaction_date=gte.{start_date}"
+        query = query.gte("transaction_date", start_date)
     if end_date:
-        filters += f"&transaction_date=lte.{end_date}"
+        query = query.lte("transaction_date", end_date)
+
+    query = query.order("transaction_date", desc=True)
+    # Tanpa limit: semua transaksi seperti sebelumnya; dengan limit: satu halaman + total
+    if limit is None:
+        return {"data": await fetch_data(query)}
+
+    page = query.range(offset, offset + limit - 1)
+    return {"data": await fetch_data(page), "total": await count_data(query)}
 
-    data = await fetch_data("transactions", filters, order_by="transaction_date.desc")
-    return {"data": data}
+
+# Mendapatkan pengeluaran per item dari struk (transaction_items), dikelompokkan per nama item
+@router.get("/items")
+async def get_item_spend(
+    name: Optional[str] = None,
+    category: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    user=Depends(get_current_user),
+):
+    user_id = user["id"]
+    query = Query("transaction_items").eq("user_id", user_id)
+
+    if name:
+        query = query.ilike("name", f"*{name}*")
+    if category:
+        query = query.eq("category", category)
+    if start_date:
+        query = query.gte("transaction_date", start_date)
+    if end_date:
+        query = query.lte("transaction_date", end_date)
+
+    data = await fetch_data(query.order("transaction_date", desc=True))
+
+    spend = {}
+    for item in data:
+        key = item["name"].strip().lower()
+        entry = spend.setdefault(
+            key, {"name": item["name"], "quantity": 0, "total": 0, "purchases": 0}
+        )
+        entry["quantity"] += item.get("quantity") or 0
+        entry["total"] += item.get("price") or 0
+        entry["purchases"] += 1
+
+    summary = sorted(spend.values(), key=lambda entry: entry["total"], reverse=True)
+    return {"data": data, "summary": summary}
 
 
 # Mendapatkan detail transaksi berdasarkan ID transaksi
 @router.get("/{id}")
 async def get_transaction_detail(id: str, user=Depends(get_current_user)):
     user_id = user["id"]
-    filters = f"&id=eq.{id}&user_id=eq.{user_id}"  # hanya milik user ini
-
-    data = await fetch_data("transactions", filters)
+    # hanya milik user ini
+    data = await fetch_data(
+        Query("transactions").eq("id", id).eq("user_id", user_id).limit(1)
+    )
 
     if not data:
         raise HTTPException(status_code=404, detail="Transaksi tidak ditemukan")
@@ -66,11 +124,13 @@ async def get_transaction_detail(id: str, user=Depends(get_current_user)):
 # Memperbarui transaksi berdasarkan ID transaksi
 @router.put("/{id}")
 async def update_transaction(
-    id: str, trans: TransactionUpdate, user=Depends(get_current_user)
+    id: str, trans: TransactionUpdate, user=Depends(get_verified_user)
 ):
     user_id = user["id"]
 
-    existing = await fetch_data("transactions", f"&id=eq.{id}&user_id=eq.{user_id}")
+    existing = await fetch_data(
+        Query("transactions").eq("id", id).eq("user_id", user_id).limit(1)
+    )
     if not existing:
         raise HTTPException(status_code=404, detail="Transaksi tidak ditemukan")
 
@@ -83,15 +143,22 @@ async def update_transaction(
     if "code" in result:
         raise HTTPException(status_code=400, detail=result)
 
+    # Koreksi kategori dari user adalah sinyal terbaik untuk model kategori
+    if update_payload.get("category"):
+        note = update_payload.get("note") or existing[0].get("note")
+        category_models.learn(user_id, note, update_payload["category"])
+
     return {"message": "Transaksi berhasil diperbarui", "data": result}
 
 
 # Menghapus transaksi berdasarkan ID transaksi
 @router.delete("/{id}")
-async def delete_transaction(id: str, user=Depends(get_current_user)):
+async def delete_transaction(id: str, user=Depends(get_verified_user)):
     user_id = user["id"]
 
-    existing = await fetch_data("transactions", f"&id=eq.{id}&user_id=eq.{user_id}")
+    existing = await fetch_data(
+        Query("transactions").eq("id", id).eq("user_id", user_id).limit(1)
+    )
     if not existing:
         raise HTTPException(status_code=404, detail="Transaksi tidak ditemukan")
 
@@ -107,8 +174,9 @@ async def delete_transaction(id: str, user=Depends(get_current_user)):
 @router.get("/summary")
 async def get_summary(user=Depends(get_current_user)):
     user_id = user["id"]
-    filters = f"&user_id=eq.{user_id}"
-    data = await fetch_data("transactions", filters)
+    data = await fetch_data(
+        Query("transactions").select("amount", "type").eq("user_id", user_id)
+    )
 
     total_income = sum(x["amount"] for x in data if x["type"] == "income")
     total_expense = sum(x["amount"] for x in data if x["type"] == "expense")
@@ -1,20 +1,30 @@
-import os
-import tempfile
+import logging
 from datetime import date
 from pathlib import Path
 
 from app.ai_models.gemini_client import parse_transaction_with_gemini
-from app.ai_models.whisper_model import transcribe_audio
+from app.ai_models.model_server import run_transcription
+from app.config import VOICE_MAX_QUEUE, VOICE_MAX_WORKERS, VOICE_TIMEOUT_SECONDS
 from app.database import insert_data
-from app.utils.auth import get_current_user
+from app.utils.auth import get_verified_user
+from app.utils.category_model import category_models
+from app.utils.executor import BoundedExecutor
+from app.utils.log import log_payload
+from app.utils.money import parse_amount
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Transkripsi dijalankan di luar event loop dengan antrean terbatas
+voice_executor = BoundedExecutor(
+    "voice", VOICE_MAX_WORKERS, VOICE_MAX_QUEUE, timeout=VOICE_TIMEOUT_SECONDS
+)
+
 
 @router.post("/transcribe-voice")
 async def transcribe_voice(
-    file: UploadFile = File(...), user=Depends(get_current_user)
+    file: UploadFile = File(...), user=Depends(get_verified_user)
 ):
     # Accept more audio formats
     allowed_types = [
@@ -35,7 +45,6 @@ async def transcribe_voice(
         )
 
     user_id = user["id"]
-    tmp_path = None
 
     try:
         # Get file extension from original filename or content type
@@ -56,36 +65,32 @@ async def transcribe_voice(
             }
             file_extension = content_type_map.get(file.content_type, ".mp3")
 
-        # Create temporary file with proper extension
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as tmp:
-            # Read and write file content
-            file_content = await file.read()
-            tmp.write(file_content)
-            tmp_path = tmp.name
-
-        # Verify file exists and has content
-        if not os.path.exists(tmp_path):
-            raise FileNotFoundError(f"Temporary file was not created: {tmp_path}")
-
-        if os.path.getsize(tmp_path) == 0:
+        file_content = await file.read()
+        if not file_content:
             raise ValueError("Uploaded file is empty")
 
-        print(
-            f"Processing audio file: {tmp_path} (size: {os.path.getsize(tmp_path)} bytes)"
+        logger.info(
+            f"Processing audio file: {file.filename} (size: {len(file_content)} bytes)"
         )
 
-        # Transcribe audio
-        text = transcribe_audio(tmp_path)
-        print(f"Transkripsi suara: {text}")
+        # Transcribe audio; file sementara dibuat dan dihapus oleh proses yang mentranskripsi
+        text = await voice_executor.run(
+            run_transcription, file_content, file_extension
+        )
+        log_payload(logger, "Transkripsi suara", text)
 
         if not text or text.strip() == "":
             raise ValueError("Tidak ada teks yang dapat ditranskripsi dari audio")
 
+        # Tebakan kategori lokal dari riwayat user, dipakai sebagai petunjuk untuk Gemini
+        suggestion = await category_models.suggest(user_id, text)
+        category_hint = suggestion[0] if suggestion else None
+
         # Parse with Gemini
-        parsed = await parse_transaction_with_gemini(text)
-        print(f"Parsed JSON: {parsed}")
+        parsed = await parse_transaction_with_gemini(text, category_hint=category_hint)
+        log_payload(logger, "Parsed JSON", parsed)
 
-        amount = float(parsed.get("amount", 0))
+        amount = parse_amount(parsed.get("amount")) or 0
         if amount <= 0:
             raise ValueError(
                 "Jumlah tidak valid atau tidak ditemukan dalam transkripsi"
@@ -96,7 +101,7 @@ async def transcribe_voice(
             "user_id": user_id,
             "amount": amount,
             "type": parsed.get("type", "expense"),
-            "category": parsed.get("category", "lainnya"),
+            "category": parsed.get("category") or category_hint or "lainnya",
             "method": "voice",
             "note": parsed.get("note", text),
             "transaction_date": str(date.today()),
@@ -111,15 +116,10 @@ async def transcribe_voice(
             "inserted": saved,
         }
 
+    except HTTPException:
+        # 503/504 dari antrean transkripsi diteruskan apa adanya
+        raise
+
     except Exception as e:
-        print(f"Error processing voice: {str(e)}")
+        logger.error(f"Error processing voice: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Gagal memproses suara: {str(e)}")
-
-    finally:
-        # Clean up temporary file
-        if tmp_path and os.path.exists(tmp_path):
-            try:
-                os.unlink(tmp_path)
-                print(f"Cleaned up temporary file: {tmp_path}")
-            except Exception as cleanup_error:
-                print(f"Failed to cleanup temporary file: {cleanup_error}")
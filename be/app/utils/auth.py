@@ -1,47 +1,165 @@
-from app.config import SUPABASE_JWT_SECRET
+import logging
+from typing import Dict, Optional, Tuple
+
+from app.config import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_QUEUE,
+    PASSWORD_HASH_TIMEOUT_SECONDS,
+    PASSWORD_HASH_WORKERS,
+    REFRESH_TOKEN_EXPIRE_DAYS,
+    SUPABASE_JWT_SECRET,
+)
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from app.database import fetch_data  # ✅ penting
+from app.database import Query, fetch_data  # ✅ penting
+from app.utils.executor import BoundedExecutor
+from passlib.context import CryptContext
 from uuid import UUID
 
+logger = logging.getLogger(__name__)
 security_scheme = HTTPBearer(auto_error=False)
 ALGORITHM = "HS256"
 
+# Kolom user yang boleh beredar di handler (tanpa password_hash)
+USER_COLUMNS = "id,name,email,role,family_id"
+# Klaim access token yang cukup untuk mengotorisasi request tanpa query ke tabel users
+USER_CLAIMS = ("name", "email", "role", "family_id")
+
+# min/max = default supaya hash dengan cost lain dianggap perlu diperbarui
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt sengaja lambat (~100-300 ms), jadi dijalankan di luar event loop
+password_executor = BoundedExecutor(
+    "bcrypt",
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_QUEUE,
+    timeout=PASSWORD_HASH_TIMEOUT_SECONDS,
+)
+
+
+async def hash_password(password: str) -> str:
+    return await password_executor.run(pwd_context.hash, password)
 
-def create_access_token(data: dict, expires_delta: timedelta = timedelta(hours=24)):
+
+async def verify_password(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify ``password`` off the event loop.
+
+    Returns:
+        tuple: ``(valid, new_hash)``; ``new_hash`` is set when the stored hash
+        uses an outdated scheme or cost and should be replaced.
+    """
+    return await password_executor.run(
+        pwd_context.verify_and_update, password, password_hash
+    )
+
+
+def create_access_token(
+    data: dict,
+    expires_delta: timedelta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+):
     to_encode = data.copy()
     expire = datetime.utcnow() + expires_delta
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SUPABASE_JWT_SECRET, algorithm=ALGORITHM)
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security_scheme),
-):
-    if not credentials:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
+def create_user_access_token(user: dict) -> str:
+    """Short-lived access token carrying the user's profile claims."""
+    claims = {claim: user.get(claim) for claim in USER_CLAIMS}
+    if claims["family_id"] is not None:
+        claims["family_id"] = str(claims["family_id"])
+    return create_access_token({"sub": str(user["id"]), "typ": "access", **claims})
+
+
+def create_refresh_token(user_id: str) -> str:
+    return create_access_token(
+        {"sub": str(user_id), "typ": "refresh"},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+
+
+def create_token_pair(user: dict) -> Dict[str, str]:
+    return {
+        "access_token": create_user_access_token(user),
+        "refresh_token": create_refresh_token(user["id"]),
+        "token_type": "bearer",
+    }
+
 
-    token = credentials.credentials
+def decode_token(token: str) -> dict:
     try:
-        payload = jwt.decode(
+        return jwt.decode(
             token,
             SUPABASE_JWT_SECRET,
             algorithms=["HS256"],
             options={"verify_aud": False},
         )
-        user_id = payload.get("sub")
+    except JWTError as e:
+        logger.info(f"JWT error: {str(e)}")
+        raise HTTPException(status_code=401, detail="Token tidak valid")
 
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token: no sub")
 
-        # ✅ Ambil data user dari Supabase table `users`
-        user_data = await fetch_data("users", f"&id=eq.{user_id}")
-        if not user_data:
-            raise HTTPException(status_code=404, detail="User not found")
+async def fetch_user(user_id: str) -> dict:
+    user_data = await fetch_data(
+        Query("users").select(USER_COLUMNS).eq("id", user_id).limit(1)
+    )
+    if not user_data:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user_data[0]
 
-        return user_data[0]  # ini sudah dict lengkap
-    except JWTError as e:
-        print("JWT error:", str(e))
+
+def _access_payload(credentials: Optional[HTTPAuthorizationCredentials]) -> dict:
+    if not credentials:
+        raise HTTPException(status_code=401, detail="Authorization header missing")
+
+    payload = decode_token(credentials.credentials)
+    if not payload.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token: no sub")
+    if payload.get("typ") == "refresh":
         raise HTTPException(status_code=401, detail="Token tidak valid")
+    return payload
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security_scheme),
+):
+    """
+    Authorize from the access token's claims, without a database read.
+
+    The claims are a snapshot from when the token was issued: a deleted user,
+    or one whose role or family changed, keeps the old claims until the token
+    expires (``ACCESS_TOKEN_EXPIRE_MINUTES``). Routes that change data use
+    ``get_verified_user`` instead.
+    """
+    payload = _access_payload(credentials)
+    user_id = payload["sub"]
+
+    # Access token baru sudah berisi profil user, tidak perlu query database
+    if payload.get("typ") == "access":
+        return {"id": user_id, **{claim: payload.get(claim) for claim in USER_CLAIMS}}
+
+    # ✅ Token lama (tanpa klaim profil): ambil data user dari Supabase table `users`
+    return await fetch_user(user_id)
+
+
+async def get_verified_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security_scheme),
+):
+    """Like ``get_current_user`` but always re-reads the user row, so revoked users are refused."""
+    payload = _access_payload(credentials)
+    try:
+        return await fetch_user(payload["sub"])
+    except HTTPException as e:
+        if e.status_code == 404:
+            raise HTTPException(status_code=401, detail="Token tidak valid")
+        raise
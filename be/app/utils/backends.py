@@ -0,0 +1,28 @@
+# app/utils/backends.py
+import logging
+from typing import Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def redis_or_memory(
+    url: Optional[str],
+    redis_factory: Callable[[str], T],
+    memory_factory: Callable[[], T],
+    name: str,
+) -> T:
+    """
+    Pick the storage for a component that can be shared through Redis.
+
+    Returns ``redis_factory(url)`` when ``url`` is set; if the ``redis``
+    package is missing (the factory raises ImportError), or no ``url`` is
+    given, returns ``memory_factory()`` and the state stays per process.
+    """
+    if url:
+        try:
+            return redis_factory(url)
+        except ImportError:
+            logger.warning(f"redis is not installed, using in-memory {name}")
+    return memory_factory()
@@ -0,0 +1,153 @@
+# app/utils/category_classifier.py
+import json
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.config import CATEGORY_DICTIONARY_PATH
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DICTIONARY_PATH = Path(__file__).resolve().parent.parent / "data" / "categories.json"
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton for substring matching of many keywords at once.
+
+    Each keyword maps to a value; ``values_in(text)`` returns the values of all
+    keywords occurring in ``text`` in a single pass, regardless of how many
+    keywords were added.
+    """
+
+    def __init__(self, keywords: Dict[str, Iterable[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Set[str]] = [set()]
+
+        for keyword, values in keywords.items():
+            node = 0
+            for char in keyword:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(set())
+                node = next_node
+            self._out[node].update(values)
+
+        # Failure link per node (BFS), output digabung dari suffix terpanjang
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] |= self._out[self._fail[child]]
+
+    def values_in(self, text: str) -> Set[str]:
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[str] = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found |= out[node]
+        return found
+
+
+class CategoryClassifier:
+    """
+    Keyword-based receipt category classifier built from a category dictionary.
+
+    Store-name keyword hits count ``store_weight`` per category and every item
+    whose name contains a category keyword adds ``item_weight``. The highest
+    score wins; ties go to the category listed first in the dictionary.
+    """
+
+    def __init__(self, dictionary: Dict):
+        self.default = dictionary.get("default", "lainnya")
+        self.store_weight = dictionary.get("store_weight", 10)
+        self.item_weight = dictionary.get("item_weight", 1)
+
+        self._order: Dict[str, int] = {}
+        store_keywords: Dict[str, Set[str]] = {}
+        item_keywords: Dict[str, Set[str]] = {}
+        for category in dictionary.get("categories", []):
+            name = category["name"]
+            self._order.setdefault(name, len(self._order))
+            for keyword in category.get("store", []):
+                store_keywords.setdefault(keyword.lower(), set()).add(name)
+            for keyword in category.get("item", []):
+                item_keywords.setdefault(keyword.lower(), set()).add(name)
+
+        self._store_index = AhoCorasick(store_keywords)
+        self._item_index = AhoCorasick(item_keywords)
+
+    def scores(self, store_name: str, item_names: Iterable[str]) -> Dict[str, float]:
+        scores: Dict[str, float] = {}
+        for name in self._store_index.values_in(store_name.lower()):
+            scores[name] = scores.get(name, 0) + self.store_weight
+        for item_name in item_names:
+            for name in self._item_index.values_in(item_name.lower()):
+                scores[name] = scores.get(name, 0) + self.item_weight
+        return scores
+
+    def classify(self, store_name: str, item_names: Iterable[str]) -> str:
+        scores = self.scores(store_name, item_names)
+        if not scores:
+            return self.default
+        return min(scores, key=lambda name: (-scores[name], self._order[name]))
+
+
+def load_dictionary(extra_path: Optional[str] = CATEGORY_DICTIONARY_PATH) -> Dict:
+    """
+    Load the bundled category dictionary, extended by ``extra_path`` if given.
+
+    Categories in the extra file with an existing name add keywords to it;
+    new names are appended. Top-level settings in the extra file override.
+    """
+    with open(DEFAULT_DICTIONARY_PATH, encoding="utf-8") as f:
+        dictionary = json.load(f)
+    if not extra_path:
+        return dictionary
+
+    with open(extra_path, encoding="utf-8") as f:
+        extra = json.load(f)
+
+    by_name = {category["name"]: category for category in dictionary["categories"]}
+    for category in extra.pop("categories", []):
+        existing = by_name.get(category["name"])
+        if existing is None:
+            dictionary["categories"].append(category)
+            by_name[category["name"]] = category
+            continue
+        for field in ("store", "item"):
+            existing[field] = existing.get(field, []) + category.get(field, [])
+    dictionary.update(extra)
+    return dictionary
+
+
+_classifier: Optional[CategoryClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier() -> CategoryClassifier:
+    """Return the shared classifier, compiling the dictionary on first use."""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = CategoryClassifier(load_dictionary())
+                logger.info("Category dictionary compiled")
+    return _classifier
@@ -0,0 +1,161 @@
+# app/utils/category_model.py
+import logging
+import math
+import re
+import zlib
+from collections import Counter, OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.config import (
+    CATEGORY_MODEL_HISTORY,
+    CATEGORY_MODEL_MAX_USERS,
+    CATEGORY_MODEL_MIN_CONFIDENCE,
+)
+from app.database import Query, fetch_data
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 18
+HASH_MASK = (1 << HASH_BITS) - 1
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+# Awalan catatan yang dibuat otomatis; sama untuk semua struk sehingga hanya jadi noise
+BOILERPLATE_PREFIX = re.compile(r"^\s*(?:ocr dari struk\s*-|hasil ocr struk)\s*", re.IGNORECASE)
+
+
+def model_text(note: Optional[str]) -> str:
+    """Strip auto-generated boilerplate from a transaction note."""
+    return BOILERPLATE_PREFIX.sub("", note or "")
+
+
+def featurize(text: str) -> Counter:
+    """Hashed word unigrams and character trigrams of ``text``."""
+    features: Counter = Counter()
+    for word in WORD_PATTERN.findall(text.lower()):
+        features[zlib.crc32(b"w:" + word.encode()) & HASH_MASK] += 1
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            features[zlib.crc32(b"c:" + padded[i : i + 3].encode()) & HASH_MASK] += 1
+    return features
+
+
+class CategoryModel:
+    """
+    Multinomial naive Bayes over hashed n-gram features.
+
+    Naive Bayes is a linear model in log space and updates incrementally by
+    counting, so each new transaction is learned in O(features).
+    """
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self.class_counts: Counter = Counter()
+        self.feature_counts: Dict[str, Counter] = {}
+        self.feature_totals: Counter = Counter()
+        self.vocabulary: set = set()
+
+    def learn(self, text: str, category: str):
+        features = featurize(text)
+        if not features or not category:
+            return
+        self.class_counts[category] += 1
+        counts = self.feature_counts.setdefault(category, Counter())
+        counts.update(features)
+        self.feature_totals[category] += sum(features.values())
+        self.vocabulary.update(features)
+
+    def predict(self, text: str) -> Optional[Tuple[str, float]]:
+        """Return ``(category, probability)`` for the most likely category."""
+        features = featurize(text)
+        # Dengan kurang dari dua kategori, tebakan selalu "yakin" tapi tidak informatif
+        if not features or len(self.class_counts) < 2:
+            return None
+
+        total_docs = sum(self.class_counts.values())
+        vocabulary_size = len(self.vocabulary) + 1
+        log_scores = {}
+        for category, doc_count in self.class_counts.items():
+            counts = self.feature_counts[category]
+            denominator = math.log(
+                self.feature_totals[category] + self.alpha * vocabulary_size
+            )
+            score = math.log(doc_count / total_docs)
+            for feature, n in features.items():
+                score += n * (math.log(counts.get(feature, 0) + self.alpha) - denominator)
+            log_scores[category] = score
+
+        # Softmax untuk mengubah skor log menjadi probabilitas
+        best = max(log_scores, key=log_scores.get)
+        top = log_scores[best]
+        normalizer = sum(math.exp(score - top) for score in log_scores.values())
+        return best, 1.0 / normalizer
+
+
+class UserCategoryModels:
+    """
+    Per-user category models, trained lazily from each user's transaction
+    history and kept in a bounded LRU.
+
+    Only categories the user chose are learned: manual transactions from the
+    history, plus categories the user sets or corrects while the model is
+    loaded. Categories assigned automatically (OCR, voice) are never learned,
+    so a wrong guess cannot reinforce itself.
+    """
+
+    def __init__(self, max_users: int, history_limit: int, min_confidence: float):
+        self.max_users = max_users
+        self.history_limit = history_limit
+        self.min_confidence = min_confidence
+        self._models: "OrderedDict[str, CategoryModel]" = OrderedDict()
+
+    async def get(self, user_id: str) -> CategoryModel:
+        user_id = str(user_id)
+        model = self._models.get(user_id)
+        if model is not None:
+            self._models.move_to_end(user_id)
+            return model
+
+        model = CategoryModel()
+        try:
+            history = await fetch_data(
+                Query("transactions")
+                .select("note", "category")
+                .eq("user_id", user_id)
+                .eq("method", "manual")
+                .order("created_at", desc=True)
+                .limit(self.history_limit)
+            )
+            for transaction in history:
+                text = model_text(transaction.get("note"))
+                if text and transaction.get("category"):
+                    model.learn(text, transaction["category"])
+        except Exception as e:
+            # Jangan simpan model kosong; coba lagi di request berikutnya
+            logger.warning(f"Failed to load category history for {user_id}: {str(e)}")
+            return model
+
+        self._models[user_id] = model
+        while len(self._models) > self.max_users:
+            self._models.popitem(last=False)
+        return model
+
+    async def suggest(self, user_id: str, text: str) -> Optional[Tuple[str, float]]:
+        """Return ``(category, confidence)`` if the model is confident enough."""
+        prediction = (await self.get(user_id)).predict(model_text(text))
+        if prediction and prediction[1] >= self.min_confidence:
+            return prediction
+        return None
+
+    def learn(self, user_id: str, text: Optional[str], category: Optional[str]):
+        """
+        Learn a category the user chose. Only updates a loaded model; an
+        unloaded one is trained from history later.
+        """
+        model = self._models.get(str(user_id))
+        text = model_text(text)
+        if model is not None and text and category:
+            model.learn(text, category)
+
+
+category_models = UserCategoryModels(
+    CATEGORY_MODEL_MAX_USERS, CATEGORY_MODEL_HISTORY, CATEGORY_MODEL_MIN_CONFIDENCE
+)
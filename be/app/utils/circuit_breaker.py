@@ -0,0 +1,64 @@
+# app/utils/circuit_breaker.py
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a dependency is degraded.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    ``before_call`` raises ``CircuitOpenError`` for ``reset_timeout`` seconds.
+    Then one trial call is let through (half-open): success closes the
+    circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started_at = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "closed":
+            return
+        now = time.monotonic()
+        # Satu percobaan saja; percobaan yang hilang (mis. dibatalkan) kedaluwarsa
+        if state == "half-open" and (
+            self._trial_started_at is None
+            or now - self._trial_started_at >= self.reset_timeout
+        ):
+            self._trial_started_at = now
+            return
+        retry_after = max(0.0, self.opened_at + self.reset_timeout - now)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_started_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_started_at = None
@@ -0,0 +1,75 @@
+# app/utils/executor.py
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a bounded queue for blocking work called from async routes.
+
+    At most ``max_workers`` jobs run at once and at most ``max_queue`` more may
+    wait. Extra callers are rejected immediately with 503 instead of piling up,
+    and callers waiting longer than ``timeout`` seconds get 504.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        max_queue: int,
+        timeout: Optional[float] = None,
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_workers + max_queue
+        self.timeout = timeout
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+
+    async def run(
+        self, func: Callable, *args, timeout: Optional[float] = None, **kwargs
+    ):
+        """Run ``func`` in the pool; ``timeout`` overrides the executor's default for this call."""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server sedang sibuk, silakan coba lagi",
+                    headers={"Retry-After": "5"},
+                )
+            self.pending += 1
+
+        # Salin context supaya contextvars (mis. request id) ikut ke thread
+        ctx = contextvars.copy_context()
+        future = self._pool.submit(ctx.run, functools.partial(func, *args, **kwargs))
+        # Slot dilepas saat pekerjaan benar-benar selesai, bukan saat caller menyerah
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)),
+                timeout=timeout if timeout is not None else self.timeout,
+            )
+        except asyncio.TimeoutError:
+            # Batalkan jika masih antre; yang sudah berjalan dibiarkan selesai
+            future.cancel()
+            raise HTTPException(
+                status_code=504,
+                detail="Waktu pemrosesan habis, silakan coba lagi",
+            )
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
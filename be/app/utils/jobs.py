@@ -0,0 +1,258 @@
+# app/utils/jobs.py
+"""
+Background jobs with pollable status.
+
+Jobs are queued and processed by the API process that accepted them; only
+their status is kept in a ``JobStore``. The default ``MemoryJobStore`` is
+local to one process, so with several uvicorn workers a poll that lands on
+another worker returns 404. ``RedisJobStore`` shares statuses between
+workers (a job is still lost if its process dies before finishing it).
+"""
+import asyncio
+import contextvars
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import orjson
+from app.utils.backends import redis_or_memory
+from app.utils.log import request_id_var
+from app.utils.webhook import send_webhook
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    id: str
+    owner_id: str
+    payload: Any
+    callback_url: Optional[str] = None
+    status: str = "queued"  # queued | processing | done | failed
+    result: Optional[Dict] = None
+    error: Optional[Any] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    # Request yang membuat job, supaya log pemrosesan job bisa dikaitkan
+    request_id: str = field(default_factory=request_id_var.get)
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobStore(ABC):
+    """Storage for job statuses, read by ``JobQueue.get``."""
+
+    @abstractmethod
+    async def save(self, job: Job):
+        ...
+
+    @abstractmethod
+    async def load(self, job_id: str) -> Optional[Job]:
+        ...
+
+
+class MemoryJobStore(JobStore):
+    """Statuses in this process only; finished jobs are dropped after ``ttl`` seconds."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._jobs: Dict[str, Job] = {}
+
+    async def save(self, job):
+        self._evict_expired()
+        self._jobs[job.id] = job
+
+    async def load(self, job_id):
+        return self._jobs.get(job_id)
+
+    def _evict_expired(self):
+        now = time.time()
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at and now - job.finished_at > self.ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class RedisJobStore(JobStore):
+    """
+    Statuses shared by all API processes through Redis (needs ``redis``).
+
+    Payloads and callback URLs are not stored. If Redis is unreachable,
+    statuses fall back to the local in-memory store.
+    """
+
+    def __init__(self, url: str, ttl: float, prefix: str = "finmate:job:"):
+        import redis.asyncio as redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._fallback = MemoryJobStore(ttl)
+
+    async def save(self, job):
+        await self._fallback.save(job)
+        record = asdict(job)
+        record.pop("payload")
+        record.pop("callback_url")
+        try:
+            await self._client.set(
+                self.prefix + job.id, orjson.dumps(record), ex=max(1, int(self.ttl))
+            )
+        except Exception as e:
+            logger.warning(f"Redis job store unavailable: {str(e)}")
+
+    async def load(self, job_id):
+        try:
+            record = await self._client.get(self.prefix + job_id)
+        except Exception as e:
+            logger.warning(f"Redis job store unavailable, using local jobs: {str(e)}")
+            return await self._fallback.load(job_id)
+        if record is None:
+            return None
+        return Job(payload=None, **orjson.loads(record))
+
+
+def create_job_store(ttl: float, url: Optional[str] = None) -> JobStore:
+    """
+    Job status storage keeping finished jobs for ``ttl`` seconds:
+    ``RedisJobStore`` so any worker can answer a poll, or ``MemoryJobStore``.
+    """
+    return redis_or_memory(
+        url,
+        lambda redis_url: RedisJobStore(redis_url, ttl),
+        lambda: MemoryJobStore(ttl),
+        "job store",
+    )
+
+
+class JobQueue:
+    """
+    In-process job queue backed by ``asyncio.Queue``.
+
+    ``handler(payload, owner)`` is awaited by background workers, which are
+    started on the first submit. Statuses go to ``store`` (memory by default)
+    so clients can poll them for ``ttl`` seconds after the job finished, and
+    an optional webhook is called on completion.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any, Dict], Awaitable[Dict]],
+        workers: int = 1,
+        max_queue: int = 32,
+        ttl: float = 3600,
+        max_retries: int = 3,
+        store: Optional[JobStore] = None,
+    ):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.ttl = ttl
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.store = store or MemoryJobStore(ttl)
+        self._owners: Dict[str, Dict] = {}
+        self._tasks = []
+
+    async def submit(
+        self, payload: Any, owner: Dict, callback_url: Optional[str] = None
+    ) -> Job:
+        self._ensure_workers()
+
+        job = Job(
+            id=str(uuid.uuid4()),
+            owner_id=str(owner["id"]),
+            payload=payload,
+            callback_url=callback_url,
+        )
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=503,
+                detail="Antrean pemrosesan penuh, silakan coba lagi",
+                headers={"Retry-After": "10"},
+            )
+
+        self._owners[job.id] = owner
+        await self.store.save(job)
+        return job
+
+    async def get(self, job_id: str, owner_id: str) -> Optional[Job]:
+        job = await self.store.load(job_id)
+        if job is None or job.owner_id != str(owner_id):
+            return None
+        return job
+
+    def _ensure_workers(self):
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            # Context kosong: worker tidak mewarisi contextvars request yang memicunya
+            task = contextvars.Context().run(asyncio.create_task, self._worker())
+            self._tasks.append(task)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            token = request_id_var.set(job.request_id)
+            try:
+                await self._process(job)
+            finally:
+                request_id_var.reset(token)
+                self._queue.task_done()
+
+    async def _process(self, job: Job):
+        job.status = "processing"
+        owner = self._owners.pop(job.id, {"id": job.owner_id})
+        await self.store.save(job)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                job.result = await self.handler(job.payload, owner)
+                job.status = "done"
+                break
+            except HTTPException as e:
+                # Executor penuh: tunggu lalu coba lagi, bukan langsung gagal
+                if e.status_code == 503 and attempt < self.max_retries:
+                    await asyncio.sleep(2**attempt)
+                    continue
+                job.status = "failed"
+                job.error = e.detail
+                break
+            except Exception as e:
+                logger.error(f"Job {job.id} in {self.name} failed: {str(e)}")
+                job.status = "failed"
+                job.error = str(e)
+                break
+
+        job.finished_at = time.time()
+        # Payload (mis. bytes gambar) tidak perlu disimpan setelah selesai
+        job.payload = None
+        await self.store.save(job)
+
+        if job.callback_url:
+            await self._notify(job)
+
+    async def _notify(self, job: Job):
+        try:
+            await send_webhook(job.callback_url, job.to_dict())
+        except HTTPException as e:
+            logger.warning(f"Webhook for job {job.id} refused: {e.detail}")
+        except Exception as e:
+            logger.warning(f"Webhook for job {job.id} failed: {str(e)}")
@@ -0,0 +1,162 @@
+# app/utils/log.py
+"""
+Non-blocking structured logging.
+
+``setup_logging()`` routes every log record through a queue: the calling
+thread only enqueues the record, and a ``QueueListener`` thread formats it
+(as one JSON object per line by default) and writes it to stdout. Records
+carry the id of the request they were logged in (``request_id_var``, set by
+``RequestMiddleware``).
+
+Large payloads (OCR output, Gemini replies, transcriptions) go through
+``log_payload``, which logs them always at DEBUG but only for a sample of
+calls otherwise.
+"""
+import atexit
+import contextvars
+import datetime
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Any, Optional
+
+import orjson
+from app.config import (
+    LOG_FORMAT,
+    LOG_LEVEL,
+    LOG_PAYLOAD_MAX_CHARS,
+    LOG_PAYLOAD_SAMPLE_RATE,
+)
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "request_id", default="-"
+)
+
+# Atribut bawaan LogRecord; atribut lain berasal dari ``extra`` dan ikut ke JSON
+# (color_message: duplikat pesan berwarna dari uvicorn)
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "color_message",
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Logger uvicorn punya handler sinkron sendiri dan propagate=False; dialihkan ke root
+# supaya access log per request juga lewat antrean
+_SERVER_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp the current request id on records before they leave the thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        elif record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Format dilakukan di thread listener; di sini cukup bekukan pesan dan traceback
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        payload = getattr(record, "payload", None)
+        if payload is not None:
+            message = f"{message} | {payload}"
+        if record.exc_text and record.exc_text not in message:
+            message = f"{message}\n{record.exc_text}"
+        return message
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """
+    Install the queue handler on the root logger and route uvicorn's loggers
+    through it (safe to call twice). Call it at startup, not at import time.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        formatter: logging.Formatter = JSONFormatter()
+    else:
+        formatter = _TextFormatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        )
+    output.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    for name in _SERVER_LOGGERS:
+        server_logger = logging.getLogger(name)
+        for existing in list(server_logger.handlers):
+            server_logger.removeHandler(existing)
+        server_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any):
+    """
+    Log a verbose payload: always at DEBUG, otherwise at INFO for a
+    ``LOG_PAYLOAD_SAMPLE_RATE`` fraction of calls. Long payloads are truncated.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        level = logging.DEBUG
+    elif random.random() < LOG_PAYLOAD_SAMPLE_RATE and logger.isEnabledFor(
+        logging.INFO
+    ):
+        level = logging.INFO
+    else:
+        return
+
+    text = payload if isinstance(payload, str) else repr(payload)
+    if len(text) > LOG_PAYLOAD_MAX_CHARS:
+        text = text[:LOG_PAYLOAD_MAX_CHARS] + "...(truncated)"
+    logger.log(level, message, extra={"payload": text, "sampled": level == logging.INFO})
+
@@ -0,0 +1,121 @@
+# app/utils/metrics.py
+"""
+Latency instrumentation exported as Prometheus histograms.
+
+``span(service, operation)`` times an upstream call (Supabase, Gemini,
+Whisper, Donut). Spans are recorded in a histogram and, inside a request,
+collected for that request's ``Server-Timing`` header. ``RequestMiddleware``
+(app/utils/middleware.py) times whole requests with ``collect_spans`` and
+``observe_request``, and ``metrics_response`` serves ``/metrics``.
+
+With several uvicorn workers set ``PROMETHEUS_MULTIPROC_DIR`` so ``/metrics``
+aggregates all workers.
+"""
+import contextvars
+import hmac
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from app.config import METRICS_TOKEN
+from fastapi import HTTPException, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Bucket dari 5 ms (query Supabase) sampai 2 menit (OCR di CPU)
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120,
+)
+
+REQUEST_LATENCY = Histogram(
+    "finmate_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_LATENCY = Histogram(
+    "finmate_upstream_duration_seconds",
+    "Latency of calls to Supabase, Gemini, Whisper and Donut",
+    ["service", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# Span milik request yang sedang berjalan: list (nama, detik). List yang sama
+# ikut ke thread pool karena contextvars disalin ke sana.
+_request_spans: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = (
+    contextvars.ContextVar("request_spans", default=None)
+)
+
+
+@contextmanager
+def span(service: str, operation: str):
+    """Time the enclosed block as one call to ``service``."""
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_LATENCY.labels(service, operation, outcome).observe(elapsed)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((service, elapsed))
+
+
+@contextmanager
+def collect_spans():
+    """Collect the spans recorded inside the block (and its threads) into a list."""
+    spans: List[Tuple[str, float]] = []
+    token = _request_spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _request_spans.reset(token)
+
+
+def server_timing(total: float, spans: List[Tuple[str, float]]) -> str:
+    """Build a Server-Timing header; spans of the same service are summed."""
+    by_service: Dict[str, List[float]] = {}
+    for service, elapsed in spans:
+        by_service.setdefault(service, []).append(elapsed)
+
+    entries = [f"app;dur={total * 1000:.1f}"]
+    for service, durations in by_service.items():
+        entries.append(
+            f'{service};dur={sum(durations) * 1000:.1f};desc="{len(durations)} call(s)"'
+        )
+    return ", ".join(entries)
+
+
+def observe_request(scope, status: int, elapsed: float):
+    # Template path (/transactions/{id}), bukan path asli, agar label tetap sedikit
+    route = scope.get("route")
+    REQUEST_LATENCY.labels(
+        scope["method"], getattr(route, "path", "unmatched"), str(status)
+    ).observe(elapsed)
+
+
+def metrics_response(authorization: Optional[str] = None) -> Response:
+    """Serve the metrics; needs ``Authorization: Bearer <METRICS_TOKEN>`` (404 without a token)."""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {METRICS_TOKEN}"
+    if not authorization or not hmac.compare_digest(
+        authorization.encode(), expected.encode()
+    ):
+        raise HTTPException(status_code=401, detail="Token metrics tidak valid")
+
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        data = generate_latest(registry)
+    else:
+        data = generate_latest()
+    return Response(content=data, media_type=CONTENT_TYPE_LATEST)
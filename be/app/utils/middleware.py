@@ -0,0 +1,61 @@
+# app/utils/middleware.py
+"""
+The one HTTP middleware of the API, written as plain ASGI.
+
+``BaseHTTPMiddleware`` layers each add a task and a copy of the body per
+request, so request ids (log.py), request timing (metrics.py) and the upload
+size limit (upload_limit.py) all run here in a single layer.
+"""
+import time
+import uuid
+
+from app.utils.log import request_id_var
+from app.utils.metrics import collect_spans, observe_request, server_timing
+from app.utils.upload_limit import enforce_upload_limit
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+class RequestMiddleware:
+    """
+    Per HTTP request: use the caller's X-Request-ID (or a new one) for all
+    logs, time the request and its upstream spans (``Server-Timing``), and
+    enforce the upload size limits.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = (_header(scope, b"x-request-id") or uuid.uuid4().hex)[:64]
+        token = request_id_var.set(request_id)
+        start = time.perf_counter()
+        status = 500
+
+        with collect_spans() as spans:
+
+            async def send_with_headers(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    elapsed = time.perf_counter() - start
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"x-request-id", request_id.encode("latin-1")),
+                        (b"server-timing", server_timing(elapsed, spans).encode()),
+                    ]
+                await send(message)
+
+            try:
+                await enforce_upload_limit(self.app, scope, receive, send_with_headers)
+            finally:
+                observe_request(scope, status, time.perf_counter() - start)
+                request_id_var.reset(token)
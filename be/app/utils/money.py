@@ -0,0 +1,75 @@
+# app/utils/money.py
+import re
+from typing import Optional, Union
+
+# Nominal rupiah: tanda minus, prefix "Rp", angka dengan pemisah titik/koma,
+# dan akhiran singkatan (25rb, 1,5jt, 50K)
+AMOUNT_PATTERN = re.compile(
+    r"(?P<sign>-)?\s*(?:rp\.?\s*)?"
+    r"(?P<number>\d[\d.,]*)"
+    r"\s*(?:(?P<suffix>k|rb|ribu|jt|juta)\b)?",
+    re.IGNORECASE,
+)
+
+SUFFIX_MULTIPLIERS = {
+    "k": 1_000,
+    "rb": 1_000,
+    "ribu": 1_000,
+    "jt": 1_000_000,
+    "juta": 1_000_000,
+}
+
+
+def _normalize_number(number: str) -> str:
+    """Turn an Indonesian or English formatted number into a float literal."""
+    number = number.rstrip(".,")
+    last_dot = number.rfind(".")
+    last_comma = number.rfind(",")
+
+    if last_dot != -1 and last_comma != -1:
+        # Pemisah yang muncul terakhir adalah desimal: 1.250.000,50 / 1,250,000.50
+        if last_dot > last_comma:
+            return number.replace(",", "")
+        return number.replace(".", "").replace(",", ".")
+
+    separator = "." if last_dot != -1 else "," if last_comma != -1 else None
+    if separator is None:
+        return number
+
+    parts = number.split(separator)
+    # Lebih dari satu pemisah, atau tepat 3 digit di belakang: pemisah ribuan
+    if len(parts) > 2 or len(parts[-1]) == 3:
+        return "".join(parts)
+    return ".".join(parts)
+
+
+def parse_amount(value: Union[str, int, float, None]) -> Optional[float]:
+    """
+    Parse a money amount as written on Indonesian receipts or in speech.
+
+    Handles the "Rp" prefix, dot or comma thousands separators, comma or dot
+    decimals and the "K", "rb"/"ribu" and "jt"/"juta" abbreviations.
+
+    Returns:
+        float | None: The amount, or None if no number is found.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    match = AMOUNT_PATTERN.search(str(value))
+    if not match:
+        return None
+
+    try:
+        amount = float(_normalize_number(match.group("number")))
+    except ValueError:
+        return None
+
+    suffix = match.group("suffix")
+    if suffix:
+        amount *= SUFFIX_MULTIPLIERS[suffix.lower()]
+    if match.group("sign"):
+        amount = -amount
+    return amount
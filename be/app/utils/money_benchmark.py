@@ -0,0 +1,72 @@
+# app/utils/money_benchmark.py
+"""
+Check and time parse_amount against a table of real-world amount formats.
+
+Usage::
+
+    python -m app.utils.money_benchmark [--repeat N]
+
+Exits with status 1 if any case in the table parses to the wrong value.
+"""
+import argparse
+import sys
+import time
+
+from app.utils.money import parse_amount
+
+# (input, expected)
+CASES = [
+    ("Rp 1.250.000", 1250000.0),
+    ("Rp1.250.000,00", 1250000.0),
+    ("1,250,000", 1250000.0),
+    ("1,250,000.50", 1250000.5),
+    ("12.500,50", 12500.5),
+    ("60.500", 60500.0),
+    ("45,000", 45000.0),
+    ("15.000,-", 15000.0),
+    ("12,5", 12.5),
+    ("12.50", 12.5),
+    ("25000", 25000.0),
+    ("25K", 25000.0),
+    ("25 rb", 25000.0),
+    ("25ribu", 25000.0),
+    ("1,5jt", 1500000.0),
+    ("2 juta", 2000000.0),
+    ("-5,000", -5000.0),
+    ("Total: Rp. 99.900", 99900.0),
+    ("25 kopi", 25.0),
+    (12000, 12000.0),
+    (12000.5, 12000.5),
+    ("", None),
+    ("gratis", None),
+    (None, None),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    failures = 0
+    for value, expected in CASES:
+        result = parse_amount(value)
+        if result != expected:
+            failures += 1
+            print(f"FAIL {value!r}: expected {expected!r}, got {result!r}")
+    print(f"{len(CASES) - failures}/{len(CASES)} cases passed")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for value, _expected in CASES:
+            parse_amount(value)
+    elapsed = time.perf_counter() - start
+    calls = args.repeat * len(CASES)
+    print(f"{calls} parses in {elapsed:.3f} s: {elapsed / calls * 1e6:.2f} us/parse")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# app/utils/rate_limit.py
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.config import TRUSTED_PROXY_HEADER, TRUSTED_PROXY_IPS
+from app.utils.backends import redis_or_memory
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage for token buckets.
+
+    ``take`` refills the bucket for the elapsed time, then removes ``cost``
+    tokens if enough are available. A cost of 0 only checks the bucket.
+    """
+
+    @abstractmethod
+    async def take(
+        self, key: str, capacity: float, refill_rate: float, cost: float
+    ) -> Tuple[bool, float]:
+        """Return ``(allowed, retry_after_seconds)``."""
+
+    @abstractmethod
+    async def reset(self, key: str):
+        ...
+
+
+class MemoryBackend(RateLimitBackend):
+    """In-process buckets, bounded to ``max_keys`` (least recently used are dropped)."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key, capacity, refill_rate, cost):
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_rate)
+
+        needed = max(cost, 1)
+        allowed = tokens >= needed
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+        if allowed:
+            return True, 0.0
+        return False, (needed - tokens) / refill_rate
+
+    async def reset(self, key):
+        self._buckets.pop(key, None)
+
+
+# Refill + take secara atomik di Redis; bucket disimpan sebagai hash {t: token, u: waktu}
+_REDIS_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 't', 'u')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local needed = math.max(cost, 1)
+local allowed = tokens >= needed
+if allowed then
+    tokens = tokens - cost
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'u', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+if allowed then
+    return {1, '0'}
+end
+return {0, tostring((needed - tokens) / rate)}
+"""
+
+
+class RedisBackend(RateLimitBackend):
+    """
+    Buckets shared by all API processes through Redis (needs ``redis``).
+
+    If Redis is unreachable, requests fall back to the local in-memory buckets
+    so logins keep working with per-process limits.
+    """
+
+    def __init__(self, url: str, prefix: str = "finmate:ratelimit:"):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(_REDIS_TAKE_SCRIPT)
+        self._fallback = MemoryBackend()
+
+    async def take(self, key, capacity, refill_rate, cost):
+        try:
+            allowed, retry_after = await self._script(
+                keys=[self.prefix + key],
+                args=[capacity, refill_rate, cost, time.time()],
+            )
+            return bool(allowed), float(retry_after)
+        except Exception as e:
+            logger.warning(f"Redis rate limit unavailable, using local buckets: {str(e)}")
+            return await self._fallback.take(key, capacity, refill_rate, cost)
+
+    async def reset(self, key):
+        await self._fallback.reset(key)
+        try:
+            await self._client.delete(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"Redis rate limit unavailable: {str(e)}")
+
+
+def create_backend(url: Optional[str] = None) -> RateLimitBackend:
+    """Token bucket storage: ``RedisBackend`` shared by all processes, or ``MemoryBackend``."""
+    return redis_or_memory(url, RedisBackend, MemoryBackend, "rate limiting")
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket per key: up to ``capacity`` requests in a burst, refilled at
+    ``capacity / period`` tokens per second.
+    """
+
+    def __init__(
+        self, name: str, capacity: int, period: float, backend: RateLimitBackend
+    ):
+        self.name = name
+        self.capacity = capacity
+        self.refill_rate = capacity / period
+        self.backend = backend
+
+    def _key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    async def hit(self, key: str, cost: float = 1) -> float:
+        """Take ``cost`` tokens. Returns 0 if allowed, else seconds until retry."""
+        allowed, retry_after = await self.backend.take(
+            self._key(key), self.capacity, self.refill_rate, cost
+        )
+        return 0.0 if allowed else retry_after
+
+    async def check(self, key: str) -> float:
+        """Like ``hit`` but without taking a token."""
+        return await self.hit(key, cost=0)
+
+    async def reset(self, key: str):
+        await self.backend.reset(self._key(key))
+
+
+def client_ip(request: Request) -> str:
+    """
+    Address to rate limit on: the peer, or the forwarded client address when
+    the peer is a trusted proxy (``TRUSTED_PROXY_IPS``).
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not TRUSTED_PROXY_IPS or (
+        "*" not in TRUSTED_PROXY_IPS and peer not in TRUSTED_PROXY_IPS
+    ):
+        return peer
+
+    forwarded = request.headers.get(TRUSTED_PROXY_HEADER, "")
+    # Entri paling kanan ditambahkan oleh proxy kita; entri kiri bisa dipalsukan klien
+    addresses = [address.strip() for address in forwarded.split(",") if address.strip()]
+    return addresses[-1] if addresses else peer
+
+
+def raise_rate_limited(retry_after: float):
+    raise HTTPException(
+        status_code=429,
+        detail="Terlalu banyak percobaan, silakan coba lagi nanti",
+        headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+    )
@@ -0,0 +1,223 @@
+# app/utils/receipt_cache.py
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import time
+import weakref
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.database import dumps, loads
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class ReceiptCache:
+    """
+    Cache of OCR extractions keyed by the SHA-256 of the uploaded image bytes.
+
+    Entries live in a bounded in-memory LRU and, when ``cache_dir`` is set, are
+    also written to disk so they survive restarts. Disk I/O runs in the thread
+    pool. Files expire ``disk_ttl`` seconds after their last use, and at most
+    ``max_disk_entries`` are kept (least recently used are pruned). Each entry
+    remembers which transaction was created from the image per user, so
+    re-uploads of the same receipt can be flagged as duplicates instead of
+    inserted again.
+
+    Concurrent requests for the same image share one computation
+    (``get_or_compute``) and can serialize on ``lock(key)``. Both only hold
+    within one process.
+    """
+
+    # Pemangkasan direktori dijalankan sekali tiap sekian penulisan
+    PRUNE_EVERY = 64
+    # mtime file disentuh paling sering sekali per interval ini saat hit di memori
+    TOUCH_INTERVAL = 3600
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        cache_dir: Optional[str] = None,
+        max_disk_entries: int = 10_000,
+        disk_ttl: float = 30 * 24 * 3600,
+    ):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self.disk_ttl = disk_ttl
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._inflight: Dict[str, "asyncio.Task"] = {}
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+            weakref.WeakValueDictionary()
+        )
+        self._writes = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """Return the cached OCR result for an image, if any."""
+        entry = await self._entry(key)
+        return entry["result"] if entry else None
+
+    async def put(self, key: str, result: Dict):
+        entry = await self._entry(key) or {"result": result, "transactions": {}}
+        entry["result"] = result
+        await self._store(key, entry)
+
+    async def get_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[Dict]]
+    ) -> Dict:
+        """
+        Return the cached result, or await ``compute()`` once for all
+        concurrent callers of ``key``. Results with an ``error`` are not cached.
+        """
+        result = await self.get(key)
+        if result is not None:
+            return result
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._compute(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._forget_inflight, key))
+        return await asyncio.shield(task)
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[Dict]]) -> Dict:
+        result = await compute()
+        if "error" not in result:
+            await self.put(key, result)
+        return result
+
+    def _forget_inflight(self, key: str, task: "asyncio.Task"):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def lock(self, key: str) -> asyncio.Lock:
+        """Per-image lock, e.g. around the duplicate check and insert of a transaction."""
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
+
+    async def get_transaction(self, user_id: str, key: str) -> Optional[str]:
+        """Return the id of the transaction this user already created from the image."""
+        entry = await self._entry(key)
+        if not entry:
+            return None
+        return entry["transactions"].get(str(user_id))
+
+    async def remember_transaction(self, user_id: str, key: str, transaction_id: str):
+        entry = await self._entry(key)
+        if not entry:
+            return
+        entry["transactions"][str(user_id)] = str(transaction_id)
+        await self._store(key, entry)
+
+    async def _entry(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            await self._touch(key)
+            return entry
+
+        if not self.cache_dir:
+            return None
+        entry = await run_in_threadpool(self._load, key)
+        if entry is not None:
+            self._remember(key, entry)
+            self._touched[key] = time.time()
+        return entry
+
+    async def _touch(self, key: str):
+        # Hit di memori juga dihitung sebagai pemakaian, kalau tidak entry
+        # terpopuler justru yang pertama kedaluwarsa/dipangkas di disk
+        if not self.cache_dir:
+            return
+        now = time.time()
+        if now - self._touched.get(key, 0) < self.TOUCH_INTERVAL:
+            return
+        self._touched[key] = now
+        try:
+            await run_in_threadpool(os.utime, self._path(key))
+        except OSError:
+            pass
+
+    def _remember(self, key: str, entry: Dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self._touched.pop(old_key, None)
+
+    async def _store(self, key: str, entry: Dict):
+        self._remember(key, entry)
+        if not self.cache_dir:
+            return
+        # Salinan dangkal + dict transaksi baru agar thread penulis tidak melihat
+        # perubahan yang terjadi setelah ini
+        snapshot = {**entry, "transactions": dict(entry["transactions"])}
+        await run_in_threadpool(self._write, key, snapshot)
+        self._touched[key] = time.time()
+
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            await run_in_threadpool(self._prune)
+
+    def _write(self, key: str, entry: Dict):
+        try:
+            path = self._path(key)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(dumps(entry))
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Failed to persist receipt cache entry: {str(e)}")
+
+    def _load(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.disk_ttl:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                entry = loads(f.read())
+            # mtime = waktu terakhir dipakai, dasar kedaluwarsa dan pemangkasan
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read receipt cache entry: {str(e)}")
+            return None
+
+    def _prune(self):
+        """Delete expired files, then the least recently used beyond ``max_disk_entries``."""
+        try:
+            files = []
+            for item in os.scandir(self.cache_dir):
+                if item.is_file() and item.name.endswith(".json"):
+                    files.append((item.stat().st_mtime, item.path))
+        except OSError as e:
+            logger.warning(f"Failed to scan receipt cache dir: {str(e)}")
+            return
+
+        files.sort(reverse=True)
+        cutoff = time.time() - self.disk_ttl
+        for i, (mtime, path) in enumerate(files):
+            if i >= self.max_disk_entries or mtime < cutoff:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
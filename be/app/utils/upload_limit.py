@@ -0,0 +1,84 @@
+# app/utils/upload_limit.py
+"""
+Reject oversized uploads before their body is read.
+
+FastAPI parses multipart forms (and Starlette spools the files to disk)
+before any dependency or route code runs, so the size checks in the routes
+only protect memory, not the disk and the time spent receiving the body.
+``enforce_upload_limit`` (run by ``RequestMiddleware``) answers 413 straight
+from a too large ``Content-Length``. Bodies without one (chunked uploads) are
+counted as they arrive and cut off with 413 as soon as they pass the limit.
+"""
+from typing import Optional
+
+from app.config import OCR_BATCH_MAX_FILES, OCR_MAX_UPLOAD_BYTES
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+
+# Ruang untuk boundary dan header multipart per file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Prefix path -> batas body; prefix terpanjang yang cocok yang dipakai
+UPLOAD_LIMITS = {
+    "/ocr/scan-struk": OCR_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    "/ocr/scan-struk/batch": OCR_BATCH_MAX_FILES
+    * (OCR_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES),
+}
+
+TOO_LARGE_DETAIL = "Ukuran upload terlalu besar"
+
+
+def upload_limit(path: str) -> Optional[int]:
+    matches = [prefix for prefix in UPLOAD_LIMITS if path.startswith(prefix)]
+    if not matches:
+        return None
+    return UPLOAD_LIMITS[max(matches, key=len)]
+
+
+def _content_length(scope) -> Optional[int]:
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            return int(value) if value.isdigit() else None
+    return None
+
+
+async def enforce_upload_limit(app, scope, receive, send):
+    """Call the ASGI ``app``, enforcing ``UPLOAD_LIMITS`` on POST bodies."""
+    if scope["method"] != "POST":
+        return await app(scope, receive, send)
+    limit = upload_limit(scope["path"])
+    if limit is None:
+        return await app(scope, receive, send)
+
+    declared = _content_length(scope)
+    if declared is not None and declared > limit:
+        response = ORJSONResponse(status_code=413, content={"detail": TOO_LARGE_DETAIL})
+        return await response(scope, receive, send)
+
+    received = 0
+    response_started = False
+
+    async def counting_receive():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                # Diteruskan FastAPI saat parsing form sebagai respons 413
+                raise HTTPException(status_code=413, detail=TOO_LARGE_DETAIL)
+        return message
+
+    async def tracking_send(message):
+        nonlocal response_started
+        if message["type"] == "http.response.start":
+            response_started = True
+        await send(message)
+
+    try:
+        await app(scope, counting_receive, tracking_send)
+    except HTTPException as e:
+        # Body dibaca di luar parser FastAPI: jawab di sini bila masih bisa
+        if e.status_code != 413 or response_started:
+            raise
+        response = ORJSONResponse(status_code=413, content={"detail": e.detail})
+        await response(scope, receive, send)
@@ -0,0 +1,87 @@
+# app/utils/webhook.py
+"""
+Outgoing webhooks for finished jobs.
+
+Callback URLs come from API clients, so ``check_callback_url`` only accepts
+http(s) URLs whose host resolves to public addresses (or is listed in
+``WEBHOOK_ALLOWED_HOSTS``). The check runs again right before sending, since
+DNS can change between submit and delivery.
+
+Bodies are signed with HMAC-SHA256 over ``"<timestamp>.<body>"`` using
+``WEBHOOK_SECRET``; receivers recompute it from the ``X-Finmate-Timestamp``
+header and compare with ``X-Finmate-Signature`` (``sha256=<hex>``).
+"""
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import socket
+import time
+from typing import Any
+from urllib.parse import urlsplit
+
+import httpx
+import orjson
+from app.config import WEBHOOK_ALLOWED_HOSTS, WEBHOOK_SECRET
+from fastapi import HTTPException
+
+
+def _invalid(reason: str) -> HTTPException:
+    return HTTPException(status_code=400, detail=f"callback_url tidak valid: {reason}")
+
+
+async def check_callback_url(url: str):
+    """Raise 400 unless ``url`` may receive webhooks."""
+    if not WEBHOOK_SECRET:
+        raise HTTPException(
+            status_code=400, detail="callback_url tidak didukung di server ini"
+        )
+
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise _invalid("harus berupa URL http(s)")
+    host = parts.hostname.lower()
+
+    if WEBHOOK_ALLOWED_HOSTS:
+        if host not in WEBHOOK_ALLOWED_HOSTS:
+            raise _invalid("host tidak diizinkan")
+        return
+
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            host, port, type=socket.SOCK_STREAM
+        )
+    except (OSError, ValueError):
+        raise _invalid("host tidak dapat di-resolve")
+
+    # Tolak bila salah satu alamat bukan publik (private, loopback, link-local, dst.)
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            raise _invalid("alamat tujuan tidak publik")
+
+
+def sign(body: bytes, timestamp: str) -> str:
+    digest = hmac.new(
+        WEBHOOK_SECRET.encode(), timestamp.encode() + b"." + body, hashlib.sha256
+    ).hexdigest()
+    return f"sha256={digest}"
+
+
+async def send_webhook(url: str, payload: Any):
+    """POST ``payload`` as signed JSON; redirects are not followed."""
+    await check_callback_url(url)
+
+    body = orjson.dumps(payload)
+    timestamp = str(int(time.time()))
+    async with httpx.AsyncClient(timeout=10, follow_redirects=False) as client:
+        await client.post(
+            url,
+            content=body,
+            headers={
+                "Content-Type": "application/json",
+                "X-Finmate-Timestamp": timestamp,
+                "X-Finmate-Signature": sign(body, timestamp),
+            },
+        )
@@ -0,0 +1,27 @@
+-- Item per struk OCR, diisi oleh app/routes/ocr.py save_transaction_items dan
+-- dibaca oleh GET /transactions/items. Jalankan sekali di SQL editor Supabase
+-- sebelum men-deploy backend yang menyimpan item struk.
+--
+-- Tipe id mengikuti tabel yang sudah ada (uuid); sesuaikan bila transactions.id
+-- atau users.id di project Anda bertipe lain. Bila RLS aktif di tabel
+-- transactions, tambahkan policy yang sama di tabel ini.
+
+create table if not exists public.transaction_items (
+    id uuid primary key default gen_random_uuid(),
+    transaction_id uuid not null references public.transactions (id) on delete cascade,
+    user_id uuid not null references public.users (id) on delete cascade,
+    name text not null,
+    quantity integer not null default 1,
+    unit_price numeric,
+    price numeric not null default 0,
+    category text,
+    transaction_date date not null,
+    created_at timestamptz not null default now()
+);
+
+-- GET /transactions/items: filter per user, urut tanggal
+create index if not exists transaction_items_user_date_idx
+    on public.transaction_items (user_id, transaction_date desc);
+-- on delete cascade dan lookup item per transaksi
+create index if not exists transaction_items_transaction_idx
+    on public.transaction_items (transaction_id);